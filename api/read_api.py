@@ -0,0 +1,404 @@
+# api/read_api.py
+#
+# Локальный HTTP-сервис чтения витрин (parquet в data/marts) для моделей, ноутбуков и т.п.
+#
+#   python api/read_api.py --port 8600
+#   curl -s 'http://127.0.0.1:8600/v1/hourly?region=krasnodar&start=2022-01-01&end=2022-01-31&columns=t2m,tp' \
+#        -H 'Accept: application/vnd.apache.arrow.stream' -o out.arrows
+#
+# Параметры: region (через запятую), start/end (включительно), columns, resample (pandas alias: 1D, 1W, 1MS, 6h),
+# format=arrow|csv|json (или заголовок Accept). Ответ стримится record batch'ами (chunked), ETag зависит от версии
+# файлов витрины, попавших в запрос, и от самого запроса; If-None-Match -> 304.
+from __future__ import annotations
+
+import argparse
+import hashlib
+import io
+import json
+import sys
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.rollups import ROLLUPS  # noqa: E402
+
+
+# mart -> где лежит и как разбит; агрегаты для resample берём из rollup-спеки, чтобы совпадали с БД
+MARTS = {
+    "hourly": {"root": "data/marts/hourly", "time_col": "ts", "by_region": True, "agg": ROLLUPS["marts.era5_hourly"]["metrics"]},
+    "daily": {"root": "data/marts/daily", "time_col": "day", "by_region": False, "agg": ROLLUPS["marts.era5_daily"]["metrics"]},
+    "indicators": {"root": "data/marts/indicators", "time_col": "day", "by_region": False, "agg": {}},
+}
+
+FORMATS = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "csv": "text/csv; charset=utf-8",
+    "json": "application/x-ndjson; charset=utf-8",
+}
+PANDAS_AGG = {"avg": "mean", "sum": "sum", "min": "min", "max": "max"}
+
+BATCH_ROWS = 64_000
+
+
+class BadRequest(ValueError):
+    pass
+
+
+# -------------------- кэш --------------------
+
+class ResponseCache:
+    """LRU готовых ответов с ограничением по суммарному размеру; ключ — ETag."""
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._items: OrderedDict[str, bytes] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            body = self._items.get(key)
+            if body is not None:
+                self._items.move_to_end(key)
+            return body
+
+    def put(self, key: str, body: bytes) -> None:
+        if len(body) > self.max_entry_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self._size -= len(self._items.pop(key))
+            self._items[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes and self._items:
+                _, old = self._items.popitem(last=False)
+                self._size -= len(old)
+
+
+# -------------------- запрос --------------------
+
+def _parse_day(v: str, name: str) -> date:
+    try:
+        return date.fromisoformat(v)
+    except ValueError:
+        raise BadRequest(f"{name}: ожидается YYYY-MM-DD, получено {v!r}") from None
+
+
+def _month_range(start: date | None, end: date | None):
+    if start is None or end is None:
+        return None
+    months, y, m = set(), start.year, start.month
+    while (y, m) <= (end.year, end.month):
+        months.add((y, m))
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return months
+
+
+def select_files(project_root: Path, mart: str, regions: list[str], start: date | None, end: date | None) -> list[Path]:
+    """Отбор parquet по пути (region=/year=/month=) — остальные файлы даже не открываются."""
+    spec = MARTS[mart]
+    root = project_root / spec["root"]
+    pattern = "region=*/year=*/month=*.parquet" if spec["by_region"] else "year=*/month=*.parquet"
+    months = _month_range(start, end)
+
+    out = []
+    for p in sorted(root.glob(pattern)):
+        if spec["by_region"] and regions and p.parent.parent.name.removeprefix("region=") not in regions:
+            continue
+        ym = (int(p.parent.name.removeprefix("year=")), int(p.stem.removeprefix("month=")))
+        if months is not None and ym not in months:
+            continue
+        out.append(p)
+    return out
+
+
+def mart_version(files: list[Path]) -> str:
+    h = hashlib.sha256()
+    for p in files:
+        st = p.stat()
+        h.update(f"{p}:{st.st_size}:{st.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()[:20]
+
+
+def parse_query(mart: str, qs: dict[str, list[str]], accept: str) -> dict:
+    def one(name: str) -> str:
+        return (qs.get(name) or [""])[0].strip()
+
+    regions = sorted({r.strip() for r in one("region").split(",") if r.strip()})
+    start = _parse_day(one("start"), "start") if one("start") else None
+    end = _parse_day(one("end"), "end") if one("end") else None
+    if start and end and start > end:
+        raise BadRequest("start > end")
+
+    columns = [c.strip() for c in one("columns").split(",") if c.strip()]
+    resample = one("resample")
+    if resample:
+        try:
+            pd.tseries.frequencies.to_offset(resample)
+        except ValueError:
+            raise BadRequest(f"resample: неизвестный интервал {resample!r}") from None
+        if not MARTS[mart]["agg"]:
+            raise BadRequest(f"resample не поддерживается для {mart}")
+
+    fmt = one("format")
+    if not fmt:
+        fmt = next((k for k, v in FORMATS.items() if v.split(";")[0] in accept), "arrow")
+    if fmt not in FORMATS:
+        raise BadRequest(f"format: одно из {sorted(FORMATS)}")
+
+    return {"mart": mart, "regions": regions, "start": start, "end": end, "columns": columns, "resample": resample, "format": fmt}
+
+
+# -------------------- чтение --------------------
+
+def _time_filter(schema: pa.Schema, t: str, start: date | None, end: date | None):
+    typ = schema.field(t).type
+    expr = None
+    if start is not None:
+        lo = datetime.combine(start, datetime.min.time()) if pa.types.is_timestamp(typ) else start
+        expr = ds.field(t) >= pa.scalar(lo).cast(typ)
+    if end is not None:
+        # end включительно: для timestamp — до начала следующего дня
+        if pa.types.is_timestamp(typ):
+            hi = ds.field(t) < pa.scalar(datetime.combine(end + timedelta(days=1), datetime.min.time())).cast(typ)
+        else:
+            hi = ds.field(t) <= pa.scalar(end).cast(typ)
+        expr = hi if expr is None else expr & hi
+    return expr
+
+
+def scan_batches(files: list[Path], q: dict):
+    """Генератор record batch'ей; без resample ничего не материализуется целиком."""
+    spec = MARTS[q["mart"]]
+    t = spec["time_col"]
+    dataset = ds.dataset([str(p) for p in files], format="parquet")
+    schema = dataset.schema
+
+    unknown = [c for c in q["columns"] if c not in schema.names]
+    if unknown:
+        raise BadRequest(f"нет колонок: {unknown}")
+    columns = ["region", t] + [c for c in (q["columns"] or schema.names) if c not in ("region", t)]
+
+    flt = _time_filter(schema, t, q["start"], q["end"])
+    if q["regions"]:
+        rf = ds.field("region").isin(q["regions"])
+        flt = rf if flt is None else flt & rf
+
+    if not q["resample"]:
+        scanner = dataset.scanner(columns=columns, filter=flt, batch_size=BATCH_ROWS)
+        n = 0
+        for b in scanner.to_batches():
+            n += b.num_rows
+            if b.num_rows:
+                yield b
+        if n == 0:
+            # пустой, но валидный поток со схемой — клиенту не нужно отличать «нет строк» от ошибки
+            yield pa.RecordBatch.from_pylist([], schema=scanner.projected_schema)
+        return
+
+    # resample: материализуем по одному региону за раз, не весь ответ
+    metrics = [c for c in columns[2:] if c in spec["agg"]]
+    agg = {c: PANDAS_AGG[spec["agg"][c]] for c in metrics}
+
+    def resampled(df: pd.DataFrame, region: str) -> pa.Table:
+        df[t] = pd.to_datetime(df[t])
+        out = df.groupby(pd.Grouper(key=t, freq=q["resample"]))[metrics].agg(agg).reset_index()
+        out.insert(0, "region", region)
+        return pa.Table.from_pandas(out, preserve_index=False)
+
+    regions = q["regions"] or sorted(set(dataset.to_table(columns=["region"], filter=flt)["region"].to_pylist()))
+    n = 0
+    for region in regions:
+        rflt = ds.field("region") == region
+        rflt = rflt if flt is None else flt & rflt
+        df = dataset.to_table(columns=["region", t] + metrics, filter=rflt).to_pandas()
+        if df.empty:
+            continue
+        n += len(df)
+        yield from resampled(df, region).to_batches(max_chunksize=BATCH_ROWS)
+    if n == 0:
+        # та же схема, что у непустого ответа: прогоняем через resample пустую таблицу
+        empty = resampled(schema.empty_table().select(["region", t] + metrics).to_pandas(), "")
+        yield pa.RecordBatch.from_pylist([], schema=empty.schema)
+
+
+def encode(batches, fmt: str):
+    """Кодирует поток batch'ей в поток байтовых кусков выбранного формата."""
+    if fmt == "arrow":
+        buf = io.BytesIO()
+        writer = None
+        for b in batches:
+            if writer is None:
+                writer = pa.ipc.new_stream(buf, b.schema)
+            writer.write_batch(b)
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        if writer is not None:
+            writer.close()
+            yield buf.getvalue()
+        return
+
+    first = True
+    for b in batches:
+        if fmt == "csv":
+            buf = io.BytesIO()
+            pa_csv.write_csv(b, buf, pa_csv.WriteOptions(include_header=first))
+            yield buf.getvalue()
+        else:
+            lines = (json.dumps(row, ensure_ascii=False, default=str) for row in b.to_pylist())
+            yield ("\n".join(lines) + "\n").encode("utf-8") if b.num_rows else b""
+        first = False
+
+
+# -------------------- HTTP --------------------
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "era5-read-api/1.0"
+    protocol_version = "HTTP/1.1"
+
+    project_root: Path = Path(".")
+    cache: ResponseCache
+
+    def log_message(self, fmt, *args):  # noqa: A003 — короче дефолтного формата
+        sys.stderr.write(f"{self.address_string()} {fmt % args}\n")
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes) -> None:
+        if data:
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+
+    def do_GET(self):  # noqa: N802
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+
+        if parts == ["healthz"]:
+            return self._send_json(HTTPStatus.OK, {"ok": True})
+        if parts == ["v1", "marts"]:
+            info = {
+                name: {"time_col": spec["time_col"], "version": mart_version(select_files(self.project_root, name, [], None, None))}
+                for name, spec in MARTS.items()
+            }
+            return self._send_json(HTTPStatus.OK, info)
+        if len(parts) != 2 or parts[0] != "v1" or parts[1] not in MARTS:
+            return self._send_json(HTTPStatus.NOT_FOUND, {"error": f"unknown path {url.path}", "marts": sorted(MARTS)})
+
+        try:
+            q = parse_query(parts[1], parse_qs(url.query), self.headers.get("Accept", ""))
+            files = select_files(self.project_root, q["mart"], q["regions"], q["start"], q["end"])
+        except BadRequest as e:
+            return self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+
+        norm = json.dumps({k: str(v) for k, v in q.items()}, sort_keys=True)
+        etag = '"' + hashlib.sha256((mart_version(files) + norm).encode("utf-8")).hexdigest()[:32] + '"'
+        if etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        cached = self.cache.get(etag)
+        if cached is not None:
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", FORMATS[q["format"]])
+            self.send_header("ETag", etag)
+            self.send_header("X-Cache", "hit")
+            self.send_header("Content-Length", str(len(cached)))
+            self.end_headers()
+            self.wfile.write(cached)
+            return
+
+        if not files:
+            return self._send_json(HTTPStatus.NOT_FOUND, {"error": "no data for query"})
+
+        chunks = encode(scan_batches(files, q), q["format"])
+        try:
+            # первый кусок до заголовков: ошибки в параметрах (колонки и т.п.) ещё можно отдать как 400
+            first = next(chunks, b"")
+        except BadRequest as e:
+            return self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+        except Exception as e:
+            self.log_error("query %s failed: %r", url.query, e)
+            return self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)})
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", FORMATS[q["format"]])
+        self.send_header("ETag", etag)
+        self.send_header("X-Cache", "miss")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        # параллельно копим ответ для LRU, пока он не вырос больше лимита записи
+        keep: list[bytes] | None = []
+        kept = 0
+        try:
+            for data in [first] if first else []:
+                self._write_chunk(data)
+                keep.append(data)
+                kept += len(data)
+            for data in chunks:
+                self._write_chunk(data)
+                if keep is not None:
+                    keep.append(data)
+                    kept += len(data)
+                    if kept > self.cache.max_entry_bytes:
+                        keep = None
+        except Exception as e:
+            # заголовки 200 уже ушли: без завершающего чанка клиент увидит оборванный ответ, соединение закрываем
+            self.log_error("query %s failed mid-stream: %r", url.query, e)
+            self.close_connection = True
+            return
+        self.wfile.write(b"0\r\n\r\n")
+
+        # пустое тело не кэшируем
+        if keep is not None and kept:
+            self.cache.put(etag, b"".join(keep))
+
+
+def serve(host: str, port: int, project_root: Path, cache_mb: int, cache_entry_mb: int) -> None:
+    Handler.project_root = project_root
+    Handler.cache = ResponseCache(cache_mb * 2**20, cache_entry_mb * 2**20)
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    print(f"read api on http://{host}:{port} (root={project_root})")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", type=str, default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8600)
+    ap.add_argument("--project-root", type=str, default=str(Path(__file__).resolve().parents[1]),
+                    help="корень, относительно которого лежит data/marts")
+    ap.add_argument("--cache-mb", type=int, default=256, help="общий размер LRU ответов")
+    ap.add_argument("--cache-entry-mb", type=int, default=16, help="ответы больше этого не кэшируются")
+    args = ap.parse_args()
+
+    serve(args.host, args.port, Path(args.project_root), args.cache_mb, args.cache_entry_mb)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,583 @@
+# benchmarks/loadtest.py
+#
+# Нагрузочный прогон запросов дашборда (load_daily / load_hourly / load_anomaly из dashboards/app.py) по Postgres.
+#
+# Запуск из корня проекта (по умолчанию — postgres из docker-compose, PGHOST/PGPORT/... или 127.0.0.1:5433):
+#   python -m benchmarks.loadtest --fill --regions 300 --years 10 --hourly-years 1     # синтетика + прогон
+#   python -m benchmarks.loadtest --concurrency 32 --duration 120
+#   python -m benchmarks.loadtest --pool --compare benchmarks/results/loadtest-<old>.json
+#   python -m benchmarks.loadtest --pg temp --fill --regions 20 --years 2               # одноразовый initdb
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import psycopg2
+from sqlalchemy import create_engine, text
+
+from benchmarks.run import PROJECT_ROOT, git_commit, temp_postgres
+
+sys.path.insert(0, str(PROJECT_ROOT))
+from common.rollups import ROLLUPS, choose_grain, rebuild_rollups, rollup_table  # noqa: E402
+
+
+REGION_PREFIX = "lt_"
+DAILY_COLS = list(ROLLUPS["marts.era5_daily"]["metrics"])
+HOURLY_COLS = list(ROLLUPS["marts.era5_hourly"]["metrics"])
+
+# доля запроса в смеси; имя в отчёте уточняется выбранной детализацией (daily_auto -> daily_week и т.п.)
+DEFAULT_MIX = {
+    "regions": 5,
+    "daily_auto": 35,
+    "daily_native_wide": 10,
+    "hourly_auto": 25,
+    "hourly_native_wide": 5,
+    "anomaly": 10,
+}
+# метрики сравнения прогонов; True = больше лучше
+COMPARE_METRICS = {"p50_ms": False, "p95_ms": False}
+
+
+def env_dsn() -> str:
+    return " ".join([
+        f"host={os.getenv('PGHOST', '127.0.0.1')}",
+        f"port={os.getenv('PGPORT', '5433')}",
+        f"dbname={os.getenv('PGDATABASE', 'agri')}",
+        f"user={os.getenv('PGUSER', 'agri')}",
+        f"password={os.getenv('PGPASSWORD', 'agri')}",
+    ])
+
+
+def make_engine(dsn: str, pool_size: int = 5):
+    return create_engine("postgresql+psycopg2://", creator=lambda: psycopg2.connect(dsn),
+                         pool_size=pool_size, max_overflow=0)
+
+
+def table_exists(conn, table: str) -> bool:
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (table,))
+        return cur.fetchone()[0]
+
+
+# -------------------- синтетика --------------------
+
+def synthetic_daily(region: str, start: date, end: date, rng: np.random.Generator) -> pd.DataFrame:
+    days = pd.date_range(start, end, freq="D")
+    n = len(days)
+    season = np.sin(2 * np.pi * (days.dayofyear.to_numpy() - 110) / 365.25)
+    t_mean = 6 + rng.normal(0, 4) + 15 * season + rng.normal(0, 3, n)
+    amp = rng.uniform(3, 8, n)
+    return pd.DataFrame({
+        "region": region,
+        "day": days.date,
+        "t2m_mean": t_mean,
+        "t2m_min": t_mean - amp,
+        "t2m_max": t_mean + amp,
+        "d2m_mean": t_mean - rng.uniform(1, 6, n),
+        "tp_sum": rng.gamma(0.6, 3.0, n) * (rng.random(n) < 0.45),
+        "swvl1_mean": np.clip(0.3 - 0.08 * season + rng.normal(0, 0.02, n), 0.05, 0.6),
+        "swvl2_mean": np.clip(0.32 - 0.06 * season + rng.normal(0, 0.015, n), 0.05, 0.6),
+        "wind_speed_10m_mean": rng.gamma(4.0, 0.9, n),
+    })
+
+
+def synthetic_hourly(region: str, start: date, end: date, rng: np.random.Generator) -> pd.DataFrame:
+    ts = pd.date_range(start, end + timedelta(days=1), freq="h", inclusive="left")
+    n = len(ts)
+    season = np.sin(2 * np.pi * (ts.dayofyear.to_numpy() - 110) / 365.25)
+    diurnal = np.sin(2 * np.pi * (ts.hour.to_numpy() - 9) / 24)
+    t2m = 6 + rng.normal(0, 4) + 15 * season + 5 * diurnal + rng.normal(0, 1.5, n)
+    u10, v10 = rng.normal(1, 3, n), rng.normal(0, 3, n)
+    return pd.DataFrame({
+        "region": region,
+        "ts": ts,
+        "t2m": t2m,
+        "d2m": t2m - rng.uniform(1, 6, n),
+        "tp": rng.gamma(0.3, 0.8, n) * (rng.random(n) < 0.08),
+        "u10": u10,
+        "v10": v10,
+        "swvl1": np.clip(0.3 - 0.08 * season + rng.normal(0, 0.01, n), 0.05, 0.6),
+        "swvl2": np.clip(0.32 - 0.06 * season + rng.normal(0, 0.005, n), 0.05, 0.6),
+        "wind_speed_10m": np.sqrt(u10**2 + v10**2),
+    })
+
+
+def copy_df(conn, df: pd.DataFrame, table: str) -> None:
+    # COPY, а не execute_values: на десятках миллионов строк заполнение иначе дольше самого прогона
+    buf = io.StringIO()
+    df.to_csv(buf, index=False, header=False)
+    buf.seek(0)
+    cols = ",".join(f'"{c}"' for c in df.columns)
+    with conn.cursor() as cur:
+        cur.copy_expert(f"COPY {table} ({cols}) FROM STDIN WITH (FORMAT csv)", buf)
+
+
+def fill_climatology(conn, regions_like: str) -> None:
+    # норма по синтетике одним SQL — для запроса load_anomaly достаточно (окно 1 день)
+    with conn.cursor() as cur:
+        for m in DAILY_COLS:
+            cur.execute(f"""
+                INSERT INTO marts.era5_climatology
+                    (region, metric, doy, n, n_years, mean, std, p10, p50, p90, ref_start, ref_end, "window")
+                SELECT region, %(metric)s, marts.doy365(day), count({m}), count(DISTINCT extract(year FROM day)),
+                       avg({m}), stddev({m}),
+                       percentile_cont(0.1) WITHIN GROUP (ORDER BY {m}),
+                       percentile_cont(0.5) WITHIN GROUP (ORDER BY {m}),
+                       percentile_cont(0.9) WITHIN GROUP (ORDER BY {m}),
+                       min(extract(year FROM day))::int, max(extract(year FROM day))::int, 1
+                FROM marts.era5_daily
+                WHERE region LIKE %(like)s
+                GROUP BY region, marts.doy365(day)
+            """, {"metric": m, "like": regions_like})
+    conn.commit()
+
+
+def fill(dsn: str, n_regions: int, start_year: int, years: int, hourly_years: int, seed: int) -> dict:
+    """Синтетические регионы lt_0000… в marts.era5_daily/era5_hourly (+ rollup'ы и норма, если таблицы есть).
+
+    Прежние синтетические строки удаляются, реальные регионы не трогаются.
+    """
+    start, end = date(start_year, 1, 1), date(start_year + years - 1, 12, 31)
+    h_start = date(start_year + years - hourly_years, 1, 1)
+    like = REGION_PREFIX.replace("_", r"\_") + "%"
+    rng = np.random.default_rng(seed)
+
+    conn = psycopg2.connect(dsn)
+    try:
+        rollup_tables = [rollup_table(s, g) for s, spec in ROLLUPS.items() for g in spec["grains"]]
+        extra = [t for t in [*rollup_tables, "marts.era5_climatology"] if table_exists(conn, t)]
+        with conn.cursor() as cur:
+            for t in ["marts.era5_daily", "marts.era5_hourly", *extra]:
+                cur.execute(f"DELETE FROM {t} WHERE region LIKE %s", (like,))
+        conn.commit()
+
+        t0 = time.perf_counter()
+        n_daily = n_hourly = 0
+        for k in range(n_regions):
+            region = f"{REGION_PREFIX}{k:04d}"
+            daily = synthetic_daily(region, start, end, rng)
+            copy_df(conn, daily, "marts.era5_daily")
+            n_daily += len(daily)
+            if hourly_years > 0:
+                hourly = synthetic_hourly(region, h_start, end, rng)
+                copy_df(conn, hourly, "marts.era5_hourly")
+                n_hourly += len(hourly)
+            conn.commit()
+            if (k + 1) % 50 == 0 or k + 1 == n_regions:
+                print(f"fill: {k + 1}/{n_regions} regions, {n_daily} daily + {n_hourly} hourly rows, "
+                      f"{time.perf_counter() - t0:.0f}s")
+
+        for source in ROLLUPS:
+            if all(t in extra for t in rollup_tables if t.startswith(source + "_")):
+                print("rollups:", source, rebuild_rollups(conn, source), "buckets")
+        if "marts.era5_climatology" in extra:
+            fill_climatology(conn, like)
+
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE")
+    finally:
+        conn.close()
+
+    return {"regions": n_regions, "start": start.isoformat(), "end": end.isoformat(),
+            "hourly_start": h_start.isoformat(), "daily_rows": n_daily, "hourly_rows": n_hourly}
+
+
+# -------------------- запросы дашборда --------------------
+# тот же SQL, что в dashboards/app.py
+
+REGIONS_SQL = "select distinct region from marts.era5_daily order by 1;"
+
+DAILY_SQL = """
+    select *
+    from marts.era5_daily
+    where region = any(:regions)
+      and day between :start and :end
+    order by region, day;
+"""
+
+HOURLY_SQL = """
+    select *
+    from marts.era5_hourly
+    where region = any(:regions)
+      and ts between :start and :end
+    order by region, ts;
+"""
+
+ANOMALY_SQL = """
+    select d.region, d.day, d.{metric} as value,
+           c.mean, c.p10, c.p90,
+           d.{metric} - c.mean as anomaly,
+           (d.{metric} - c.mean) / nullif(c.std, 0) as zscore
+    from marts.era5_daily d
+    join marts.era5_climatology c
+      on c.region = d.region and c.metric = :metric and c.doy = marts.doy365(d.day)
+    where d.region = any(:regions)
+      and d.day between :start and :end
+    order by d.region, d.day;
+"""
+
+
+def rollup_sql(source: str, grain: str, time_col: str) -> str:
+    metrics = ", ".join(ROLLUPS[source]["metrics"])
+    return f"""
+        select region, bucket_start as {time_col}, n_rows, {metrics}
+        from {rollup_table(source, grain)}
+        where region = any(:regions)
+          and bucket_end > :start and bucket_start <= :end
+        order by region, bucket_start;
+    """
+
+
+def workload_context(dsn: str) -> dict:
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(REGIONS_SQL)
+            regions = [r[0] for r in cur.fetchall()]
+            cur.execute("select min(day), max(day) from marts.era5_daily")
+            d_range = cur.fetchone()
+            cur.execute("select min(ts), max(ts) from marts.era5_hourly")
+            h_range = cur.fetchone()
+            cur.execute("""
+                select c.relname, c.reltuples::bigint, pg_total_relation_size(c.oid)
+                from pg_class c join pg_namespace n on n.oid = c.relnamespace
+                where n.nspname = 'marts' and c.relkind in ('r', 'p')
+                order by 1
+            """)
+            tables = {name: {"rows_est": rows, "bytes": size} for name, rows, size in cur.fetchall()}
+        rollups_ok = {
+            s: all(table_exists(conn, rollup_table(s, g)) for g in spec["grains"]) for s, spec in ROLLUPS.items()
+        }
+        has_clim = table_exists(conn, "marts.era5_climatology")
+    finally:
+        conn.close()
+
+    if not regions or d_range[0] is None:
+        raise SystemExit("В marts.era5_daily нет данных — запусти с --fill.")
+    return {
+        "regions": regions,
+        "daily_range": d_range,
+        "hourly_range": (h_range[0].date(), h_range[1].date()) if h_range[0] else None,
+        "rollups": rollups_ok,
+        "climatology": has_clim,
+        "tables": tables,
+    }
+
+
+def _pick_regions(rng: random.Random, regions: list[str]) -> list[str]:
+    # в дашборде по умолчанию выбран один регион; сравнивают обычно 2–4
+    k = rng.choices([1, 2, 3, 4], weights=[60, 20, 10, 10])[0]
+    return rng.sample(regions, min(k, len(regions)))
+
+
+def _pick_span(rng: random.Random, lo: date, hi: date, days: int) -> tuple[date, date]:
+    days = min(days, (hi - lo).days + 1)
+    start = lo + timedelta(days=rng.randint(0, (hi - lo).days + 1 - days))
+    return start, start + timedelta(days=days - 1)
+
+
+def _span_days(rng: random.Random) -> int:
+    # неделя–месяц чаще всего, но бывают и «покажи все 10 лет»
+    kind = rng.choices(["short", "medium", "wide"], weights=[50, 30, 20])[0]
+    return {"short": rng.randint(7, 31), "medium": rng.randint(32, 365), "wide": rng.randint(366, 3650)}[kind]
+
+
+def build_query(shape: str, rng: random.Random, ctx: dict) -> tuple[str, str, dict] | None:
+    """(имя в отчёте, SQL, параметры) или None, если запрос неприменим (нет hourly, нет нормы)."""
+    if shape == "regions":
+        return "regions", REGIONS_SQL, {}
+
+    regions = _pick_regions(rng, ctx["regions"])
+    if shape in ("daily_auto", "daily_native_wide", "anomaly"):
+        lo, hi = ctx["daily_range"]
+        if shape == "daily_native_wide":
+            start, end = _pick_span(rng, lo, hi, rng.randint(366, 3650))
+            return "daily_day_wide", DAILY_SQL, {"regions": regions, "start": start, "end": end}
+        if shape == "anomaly":
+            if not ctx["climatology"]:
+                return None
+            start, end = _pick_span(rng, lo, hi, _span_days(rng))
+            metric = rng.choice(DAILY_COLS)
+            return "anomaly", ANOMALY_SQL.format(metric=metric), {
+                "regions": regions, "start": start, "end": end, "metric": metric,
+            }
+        start, end = _pick_span(rng, lo, hi, _span_days(rng))
+        grain = choose_grain("marts.era5_daily", start, end, len(regions))
+        if grain == "day" or not ctx["rollups"]["marts.era5_daily"]:
+            return "daily_day", DAILY_SQL, {"regions": regions, "start": start, "end": end}
+        return f"daily_{grain}", rollup_sql("marts.era5_daily", grain, "day"), {
+            "regions": regions, "start": start, "end": end,
+        }
+
+    if ctx["hourly_range"] is None:
+        return None
+    lo, hi = ctx["hourly_range"]
+    days = rng.randint(31, 92) if shape == "hourly_native_wide" else _span_days(rng)
+    start, end = _pick_span(rng, lo, hi, days)
+    start_dt = datetime.combine(start, datetime.min.time())
+    end_dt = datetime.combine(end, datetime.max.time())
+    params = {"regions": regions, "start": start_dt, "end": end_dt}
+    grain = "hour" if shape == "hourly_native_wide" else choose_grain("marts.era5_hourly", start, end, len(regions))
+    if grain == "hour" or not ctx["rollups"]["marts.era5_hourly"]:
+        return ("hourly_hour_wide" if shape == "hourly_native_wide" else "hourly_hour"), HOURLY_SQL, params
+    return f"hourly_{grain}", rollup_sql("marts.era5_hourly", grain, "ts"), params
+
+
+# -------------------- прогон --------------------
+
+def run_load(dsn: str, ctx: dict, mix: dict[str, int], concurrency: int, duration: float,
+             seed: int, pool: bool, use_pandas: bool) -> tuple[list[dict], dict[str, tuple[str, dict]], float]:
+    """Каждый поток — отдельный «пользователь»: выбирает запрос по весам и выполняет его до дедлайна.
+
+    Без --pool движок создаётся на каждый запрос, как сейчас в dashboards/app.py (create_engine внутри load_*).
+    """
+    shapes, weights = zip(*[(s, w) for s, w in mix.items() if w > 0])
+    shared = make_engine(dsn, pool_size=concurrency) if pool else None
+    samples: list[dict] = []
+    examples: dict[str, tuple[str, dict]] = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def user(k: int) -> None:
+        rng = random.Random(seed * 1000 + k)
+        local = []
+        while time.perf_counter() < deadline:
+            q = build_query(rng.choices(shapes, weights=weights)[0], rng, ctx)
+            if q is None:
+                continue
+            name, sql, params = q
+            eng = shared if shared is not None else make_engine(dsn, pool_size=1)
+            t0 = time.perf_counter()
+            err, rows = None, 0
+            try:
+                with eng.connect() as c:
+                    if use_pandas:
+                        rows = len(pd.read_sql(text(sql), c, params=params))
+                    else:
+                        rows = len(c.execute(text(sql), params).fetchall())
+            except Exception as e:  # noqa: BLE001 — ошибка запроса идёт в отчёт, прогон продолжается
+                err = f"{type(e).__name__}: {e}".splitlines()[0]
+            finally:
+                if shared is None:
+                    eng.dispose()
+            local.append({"shape": name, "ms": (time.perf_counter() - t0) * 1000, "rows": rows, "error": err})
+            with lock:
+                examples.setdefault(name, (sql, params))
+        with lock:
+            samples.extend(local)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        list(ex.map(user, range(concurrency)))
+    wall = time.perf_counter() - t0
+    if shared is not None:
+        shared.dispose()
+    return samples, examples, wall
+
+
+def summarize(samples: list[dict], wall: float) -> dict[str, dict]:
+    # колонки явно: при пустом samples (короткий --duration, все формы пропущены) отчёт просто пустой
+    df = pd.DataFrame(samples, columns=["shape", "ms", "rows", "error"])
+    out = {}
+    for name, g in df.groupby("shape"):
+        ok = g[g["error"].isna()]
+        ms = ok["ms"].to_numpy()
+        out[name] = {
+            "n": int(len(g)),
+            "errors": int(g["error"].notna().sum()),
+            "first_error": g["error"].dropna().iloc[0] if g["error"].notna().any() else None,
+            "qps": round(len(g) / wall, 2),
+            "p50_ms": round(float(np.percentile(ms, 50)), 2) if len(ms) else None,
+            "p95_ms": round(float(np.percentile(ms, 95)), 2) if len(ms) else None,
+            "p99_ms": round(float(np.percentile(ms, 99)), 2) if len(ms) else None,
+            "max_ms": round(float(ms.max()), 2) if len(ms) else None,
+            "rows_mean": round(float(ok["rows"].mean()), 1) if len(ok) else None,
+            "rows_total": int(ok["rows"].sum()),
+        }
+    return out
+
+
+def _plan_nodes(node: dict, out: list[str]) -> None:
+    label = node["Node Type"]
+    if "Index Name" in node:
+        label += f" using {node['Index Name']}"
+    if "Relation Name" in node:
+        label += f" on {node['Relation Name']}"
+    out.append(label)
+    for child in node.get("Plans", []):
+        _plan_nodes(child, out)
+
+
+def explain(dsn: str, examples: dict[str, tuple[str, dict]]) -> dict[str, dict]:
+    """EXPLAIN (ANALYZE, BUFFERS) на один пример каждого запроса — после прогона, чтобы не мешать замерам."""
+    eng = make_engine(dsn, pool_size=1)
+    plans = {}
+    try:
+        with eng.connect() as c:
+            for name, (sql, params) in sorted(examples.items()):
+                (plan,) = c.execute(text("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql), params).fetchone()
+                plan = plan[0] if isinstance(plan, list) else json.loads(plan)[0]
+                root = plan["Plan"]
+                nodes: list[str] = []
+                _plan_nodes(root, nodes)
+                plans[name] = {
+                    "params": {k: v if isinstance(v, (list, str)) else str(v) for k, v in params.items()},
+                    "nodes": nodes,
+                    "planning_ms": plan.get("Planning Time"),
+                    "execution_ms": plan.get("Execution Time"),
+                    "rows": root.get("Actual Rows"),
+                    "shared_hit": root.get("Shared Hit Blocks"),
+                    "shared_read": root.get("Shared Read Blocks"),
+                    "plan": plan,
+                }
+    finally:
+        eng.dispose()
+    return plans
+
+
+def print_report(stats: dict[str, dict], plans: dict[str, dict], wall: float) -> None:
+    total = sum(s["n"] for s in stats.values())
+    print(f"\n{total} запросов за {wall:.1f}s ({total / wall:.1f} qps)")
+    print(f"{'shape':20s} {'n':>6} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rows/q':>9}")
+    for name, s in sorted(stats.items()):
+        print(f"{name:20s} {s['n']:>6} {s['errors']:>4} {s['p50_ms']!s:>9} {s['p95_ms']!s:>9} "
+              f"{s['p99_ms']!s:>9} {s['rows_mean']!s:>9}")
+        if s["first_error"]:
+            print(f"{'':20s} ! {s['first_error']}")
+    print()
+    for name, p in sorted(plans.items()):
+        print(f"{name}: exec {p['execution_ms']} ms, rows {p['rows']}, "
+              f"buffers hit={p['shared_hit']} read={p['shared_read']}")
+        print("   ", " -> ".join(p["nodes"]))
+
+
+def compare(old: dict, new: dict, threshold: float) -> list[str]:
+    regressions = []
+    for name, s in sorted(new["shapes"].items()):
+        prev = old.get("shapes", {}).get(name)
+        if not prev:
+            continue
+        for metric, higher_is_better in COMPARE_METRICS.items():
+            a, b = prev.get(metric), s.get(metric)
+            if not a or not b:
+                continue
+            change = (b - a) / a
+            worse = -change if higher_is_better else change
+            line = f"{name:20s} {metric}: {a} -> {b} ({change:+.1%})"
+            print(line)
+            if worse > threshold:
+                regressions.append(line)
+    return regressions
+
+
+def parse_mix(s: str) -> dict[str, int]:
+    if not s.strip():
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in s.split(","):
+        name, _, w = part.partition("=")
+        if name.strip() not in DEFAULT_MIX:
+            raise SystemExit(f"--mix: неизвестный запрос {name!r}, есть: {', '.join(DEFAULT_MIX)}")
+        mix[name.strip()] = int(w or 1)
+    return mix
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pg", choices=["dsn", "temp"], default="dsn",
+                    help="dsn = --pg-dsn / PG* env (по умолчанию postgres из docker-compose); temp = одноразовый initdb")
+    ap.add_argument("--pg-dsn", type=str, default=os.getenv("LOADTEST_PG_DSN", ""))
+    ap.add_argument("--fill", action="store_true", help="перед прогоном залить синтетические регионы")
+    ap.add_argument("--regions", type=int, default=100)
+    ap.add_argument("--start-year", type=int, default=2015)
+    ap.add_argument("--years", type=int, default=10)
+    ap.add_argument("--hourly-years", type=int, default=1, help="hourly только за последние N лет периода")
+    ap.add_argument("--no-run", action="store_true", help="только заполнить")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--duration", type=float, default=60.0, help="секунд нагрузки")
+    ap.add_argument("--mix", type=str, default="",
+                    help="веса запросов, например daily_auto=50,hourly_auto=30,anomaly=20 (по умолчанию смесь дашборда)")
+    ap.add_argument("--pool", action="store_true",
+                    help="общий пул соединений вместо create_engine на каждый запрос (как сейчас в app.py)")
+    ap.add_argument("--pandas", action="store_true", help="читать через pd.read_sql, как дашборд (с построением DataFrame)")
+    ap.add_argument("--no-explain", action="store_true")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", type=str, default="", help="по умолчанию benchmarks/results/loadtest-<commit>.json")
+    ap.add_argument("--compare", type=str, default="", help="JSON предыдущего прогона")
+    ap.add_argument("--threshold", type=float, default=0.15, help="допустимое ухудшение p50/p95")
+    args = ap.parse_args()
+
+    if args.pg == "temp":
+        with temp_postgres() as dsn:
+            run(args, dsn, force_fill=True)
+    else:
+        run(args, args.pg_dsn or env_dsn())
+
+
+def run(args, dsn: str, force_fill: bool = False) -> None:
+    filled = None
+    if args.fill or force_fill:
+        filled = fill(dsn, args.regions, args.start_year, args.years, args.hourly_years, args.seed)
+    if args.no_run:
+        return
+
+    ctx = workload_context(dsn)
+    mix = parse_mix(args.mix)
+    print(f"load: {len(ctx['regions'])} regions, daily {ctx['daily_range'][0]}..{ctx['daily_range'][1]}, "
+          f"hourly {ctx['hourly_range']}, concurrency={args.concurrency}, {args.duration:.0f}s")
+    samples, examples, wall = run_load(
+        dsn, ctx, mix, args.concurrency, args.duration, args.seed, args.pool, args.pandas,
+    )
+    stats = summarize(samples, wall)
+    plans = {} if args.no_explain else explain(dsn, examples)
+    print_report(stats, plans, wall)
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "git_commit": commit,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "argv": sys.argv[1:],
+            "concurrency": args.concurrency,
+            "duration_s": round(wall, 1),
+            "pool": args.pool,
+            "pandas": args.pandas,
+            "mix": mix,
+            "fill": filled,
+            "tables": ctx["tables"],
+        },
+        "shapes": stats,
+        "plans": plans,
+    }
+    out = Path(args.out) if args.out else PROJECT_ROOT / "benchmarks" / "results" / f"loadtest-{commit}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+    print("OK:", out)
+
+    if args.compare:
+        old = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(old, report, args.threshold)
+        if regressions:
+            print("REGRESSIONS:")
+            for line in regressions:
+                print("  ", line)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+# benchmarks/run.py
+#
+# Запуск из корня проекта:
+#   python -m benchmarks.run --resolutions 0.1,0.05 --days 7,31 --regions 1,4
+#   python -m benchmarks.run --compare benchmarks/results/<old>.json
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing as mp
+import queue
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from benchmarks.synthetic import DEFAULT_VARS, generate_raw, grid_axes, synthetic_regions
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+STAGES = ["region_mean_timeseries", "convert_units", "aggregate_one_month", "upsert_hourly", "upsert_daily"]
+# метрики, по которым сравниваем прогоны; True = больше лучше
+COMPARE_METRICS = {"rows_per_s": True, "stage_rss_mb": False}
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _maxrss_mb() -> float:
+    # linux: KiB, macOS: байты
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+# -------------------- postgres --------------------
+
+@contextmanager
+def temp_postgres():
+    """Одноразовый кластер Postgres (initdb/pg_ctl из PATH) с таблицами из docker/init."""
+    td = Path(tempfile.mkdtemp(prefix="bench-pg-"))
+    data = td / "data"
+    port = 55432
+    try:
+        subprocess.run(["initdb", "-D", str(data), "-U", "agri", "--auth=trust"], check=True, capture_output=True)
+        subprocess.run(
+            ["pg_ctl", "-D", str(data), "-w", "-l", str(td / "pg.log"),
+             "-o", f"-p {port} -k {td} -c listen_addresses=''", "start"],
+            check=True,
+            capture_output=True,
+        )
+        dsn = f"host={td} port={port} dbname=postgres user=agri"
+        import psycopg2
+
+        conn = psycopg2.connect(dsn)
+        try:
+            with conn.cursor() as cur:
+                for sql_file in sorted((PROJECT_ROOT / "docker" / "init").glob("*.sql")):
+                    cur.execute(sql_file.read_text(encoding="utf-8"))
+            conn.commit()
+        finally:
+            conn.close()
+        yield dsn
+    finally:
+        subprocess.run(["pg_ctl", "-D", str(data), "-m", "immediate", "stop"], capture_output=True)
+        shutil.rmtree(td, ignore_errors=True)
+
+
+class _StandInCursor:
+    query: bytes = b""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class StandInConn:
+    """Заглушка соединения: считает только Python-сторону upsert (df -> tuples -> SQL-литералы)."""
+
+    def cursor(self):
+        return _StandInCursor()
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _standin_execute_values(cur, sql, values, page_size=100):
+    # грубая имитация mogrify: страница строк -> текстовые литералы -> готовый запрос в байтах, как у psycopg2
+    for i in range(0, len(values), page_size):
+        page = values[i:i + page_size]
+        literals = ",".join("(" + ",".join(repr(v) for v in row) + ")" for row in page)
+        cur.query = sql.replace("%s", literals, 1).encode("utf-8")
+
+
+# -------------------- стадии --------------------
+
+def _stage_inputs(stage: str, case_dir: Path) -> list[Path]:
+    if stage == "region_mean_timeseries":
+        return sorted(f for f in (case_dir / "raw").rglob("month=*") if f.suffix in (".nc", ".zip"))
+    if stage == "upsert_daily":
+        return sorted((case_dir / "daily").rglob("*.parquet"))
+    return sorted((case_dir / "hourly").rglob("*.parquet"))
+
+
+def _run_stage(stage: str, case_dir: str, repeat: int, dsn: str, out_q) -> None:
+    """Выполняется в отдельном процессе, чтобы peak RSS относился к одной стадии.
+
+    В out_q всегда уходит ответ — результат или {"error": traceback}, иначе родитель ждал бы вечно.
+    """
+    try:
+        out_q.put(_measure_stage(stage, case_dir, repeat, dsn))
+    except BaseException:  # noqa: BLE001 — любую ошибку отдаём родителю текстом
+        out_q.put({"error": traceback.format_exc()})
+
+
+def _measure_stage(stage: str, case_dir: str, repeat: int, dsn: str) -> dict:
+    sys.path.insert(0, str(PROJECT_ROOT))
+    from common.instrumentation import configure, peak_mb, reset_peak, rss_mb
+    from dask_jobs.aggregate_daily import aggregate_one_month
+    from dask_jobs.aggregate_hourly import convert_units, region_mean_timeseries
+
+    # region_mean_timeseries и loader'ы открывают свои stage(): каждая сбросила бы VmHWM,
+    # и пик остался бы только от последнего файла. Пик здесь меряем сами — на всю стадию бенча.
+    configure(reset_peak=False)
+
+    case = Path(case_dir)
+    files = _stage_inputs(stage, case)
+
+    conn = None
+    if stage.startswith("upsert"):
+        if stage == "upsert_hourly":
+            import flows.load_hourly_parquet_to_postgres as loader
+        else:
+            import flows.load_daily_parquet_to_postgres as loader
+        if dsn:
+            import psycopg2
+
+            conn = psycopg2.connect(dsn)
+        else:
+            loader.execute_values = _standin_execute_values
+            conn = StandInConn()
+        table = "marts.era5_hourly" if stage == "upsert_hourly" else "marts.era5_daily"
+
+    frames = [pd.read_parquet(f) for f in files] if stage != "region_mean_timeseries" else []
+    # rows/s для aggregate_one_month — по входным hourly-строкам, а не по получившимся дням
+    input_rows = {f: pq.read_metadata(f).num_rows for f in files} if stage == "aggregate_one_month" else {}
+
+    # база — после импортов и чтения входа: иначе пик процесса почти целиком состоит из xarray/dask
+    # и одинаков для всех стадий. На linux сбрасываем VmHWM, без этого — пик за жизнь процесса.
+    peak_reset = reset_peak()
+    rss_before = rss_mb() if peak_reset else _maxrss_mb()
+
+    walls, cpus, rows = [], [], 0
+    for _ in range(repeat):
+        if conn is not None and dsn:
+            with conn.cursor() as cur:
+                cur.execute(f"TRUNCATE {table}")
+            conn.commit()
+        inputs = [f.copy() for f in frames]
+
+        t0, c0 = time.perf_counter(), time.process_time()
+        rows = 0
+        if stage == "region_mean_timeseries":
+            for f in files:
+                rows += len(region_mean_timeseries(str(f), DEFAULT_VARS))
+        elif stage == "convert_units":
+            for df in inputs:
+                rows += len(convert_units(df))
+        elif stage == "aggregate_one_month":
+            for f in files:
+                aggregate_one_month(f)
+                rows += input_rows[f]
+        else:
+            for df in inputs:
+                loader.upsert_df(conn, df, table=table)
+                rows += len(df)
+        walls.append(time.perf_counter() - t0)
+        cpus.append(time.process_time() - c0)
+
+    peak = peak_mb() if peak_reset else _maxrss_mb()
+
+    if conn is not None:
+        conn.close()
+
+    return {
+        "rows": rows,
+        "input_bytes": sum(f.stat().st_size for f in files),
+        "wall_s_min": min(walls),
+        "wall_s_median": statistics.median(walls),
+        "cpu_s_median": statistics.median(cpus),
+        "rss_before_mb": round(rss_before, 1),
+        "peak_rss_mb": round(peak, 1),
+        "stage_rss_mb": round(max(peak - rss_before, 0.0), 1),
+        "peak_is_stage_local": peak_reset,
+    }
+
+
+def _isolated(stage: str, case_dir: Path, repeat: int, dsn: str) -> dict:
+    ctx = mp.get_context("spawn")
+    q = ctx.Queue()
+    p = ctx.Process(target=_run_stage, args=(stage, str(case_dir), repeat, dsn, q))
+    p.start()
+    # ждём ответ, пока процесс жив: если он умер, не успев ничего положить (OOM-killer и т.п.), q.get() без таймаута висел бы
+    res = None
+    while res is None:
+        try:
+            res = q.get(timeout=1.0)
+        except queue.Empty:
+            if not p.is_alive():
+                try:
+                    res = q.get(timeout=1.0)  # мог положить ответ прямо перед выходом
+                except queue.Empty:
+                    p.join()
+                    raise RuntimeError(f"stage {stage} died with exit code {p.exitcode} without a result") from None
+    p.join()
+    if "error" in res:
+        raise RuntimeError(f"stage {stage} failed (exit code {p.exitcode}):\n{res['error']}")
+    if p.exitcode != 0:
+        raise RuntimeError(f"stage {stage} failed with exit code {p.exitcode}")
+    return res
+
+
+def prepare_case(case_dir: Path, *, resolution: float, days: int, n_regions: int, time_name: str, as_zip: bool) -> None:
+    sys.path.insert(0, str(PROJECT_ROOT))
+    from dask_jobs.aggregate_daily import aggregate_one_month
+    from dask_jobs.aggregate_hourly import process_one
+
+    regions = synthetic_regions(n_regions, str(PROJECT_ROOT / "config" / "regions.yaml"))
+    generate_raw(
+        raw_root=case_dir / "raw",
+        regions=regions,
+        year=2022,
+        months=[1],
+        resolution=resolution,
+        days=days,
+        time_name=time_name,
+        as_zip=as_zip,
+    )
+    for region in regions:
+        process_one(region, 2022, 1, str(case_dir / "raw"), str(case_dir / "hourly"), DEFAULT_VARS)
+        hp = case_dir / "hourly" / f"region={region}" / "year=2022" / "month=01.parquet"
+        out = case_dir / "daily" / f"region={region}" / "month=01.parquet"
+        out.parent.mkdir(parents=True, exist_ok=True)
+        aggregate_one_month(hp).to_parquet(out, index=False)
+
+
+def run_suite(args, dsn: str) -> list[dict]:
+    results = []
+    stages = [s for s in args.stages.split(",") if s.strip()]
+    with tempfile.TemporaryDirectory(prefix="bench-") as td:
+        for res in [float(x) for x in args.resolutions.split(",")]:
+            for days in [int(x) for x in args.days.split(",")]:
+                for n_regions in [int(x) for x in args.regions.split(",")]:
+                    case_dir = Path(td) / f"res={res}_days={days}_regions={n_regions}"
+                    prepare_case(
+                        case_dir, resolution=res, days=days, n_regions=n_regions,
+                        time_name=args.time_name, as_zip=args.zip,
+                    )
+                    # размер сетки считаем по первому bbox — для подписи кейса
+                    area = next(iter(synthetic_regions(1, str(PROJECT_ROOT / "config" / "regions.yaml")).values()))
+                    lat, lon = grid_axes(area, res)
+                    for stage in stages:
+                        r = _isolated(stage, case_dir, args.repeat, dsn)
+                        r.update(
+                            stage=stage,
+                            resolution=res,
+                            grid=[len(lat), len(lon)],
+                            days=days,
+                            regions=n_regions,
+                            rows_per_s=round(r["rows"] / r["wall_s_min"], 1) if r["wall_s_min"] else None,
+                            mb_per_s=round(r["input_bytes"] / 2**20 / r["wall_s_min"], 2) if r["wall_s_min"] else None,
+                        )
+                        if stage == "region_mean_timeseries":
+                            r["cells_per_s"] = round(r["rows"] * len(lat) * len(lon) / r["wall_s_min"], 1)
+                        results.append(r)
+                        print(
+                            f"{stage:24s} res={res} days={days:<3d} regions={n_regions:<3d} "
+                            f"{r['rows_per_s']:>12} rows/s  {r['stage_rss_mb']:>8} MB"
+                        )
+    return results
+
+
+def _case_key(r: dict) -> tuple:
+    return (r["stage"], r["resolution"], r["days"], r["regions"])
+
+
+def compare(old: dict, new: dict, threshold: float) -> list[str]:
+    old_idx = {_case_key(r): r for r in old["results"]}
+    regressions = []
+    for r in new["results"]:
+        prev = old_idx.get(_case_key(r))
+        if not prev:
+            continue
+        for metric, higher_is_better in COMPARE_METRICS.items():
+            a, b = prev.get(metric), r.get(metric)
+            if not a or not b:
+                continue
+            change = (b - a) / a
+            worse = -change if higher_is_better else change
+            line = f"{r['stage']:24s} {_case_key(r)[1:]} {metric}: {a} -> {b} ({change:+.1%})"
+            print(line)
+            if worse > threshold:
+                regressions.append(line)
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--resolutions", type=str, default="0.1", help="шаг сетки в градусах, например: 0.1,0.05")
+    ap.add_argument("--days", type=str, default="7,31")
+    ap.add_argument("--regions", type=str, default="1,4")
+    ap.add_argument("--stages", type=str, default=",".join(STAGES))
+    ap.add_argument("--time-name", choices=["valid_time", "time"], default="valid_time")
+    ap.add_argument("--zip", action="store_true", help="синтетика в ZIP, как отдаёт новый CDS")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--pg", choices=["standin", "temp", "dsn"], default="standin",
+                    help="standin = без БД; temp = одноразовый initdb; dsn = --pg-dsn")
+    ap.add_argument("--pg-dsn", type=str, default=os.getenv("BENCH_PG_DSN", ""))
+    ap.add_argument("--out", type=str, default="", help="по умолчанию benchmarks/results/<commit>.json")
+    ap.add_argument("--compare", type=str, default="", help="JSON предыдущего прогона")
+    ap.add_argument("--threshold", type=float, default=0.15, help="допустимое ухудшение метрики")
+    args = ap.parse_args()
+
+    # метрики стадий из common.instrumentation бенчмарку не нужны — только шум на диске
+    os.environ.setdefault("ETL_METRICS_PATH", "off")
+
+    commit = git_commit()
+    meta = {
+        "git_commit": commit,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pg": args.pg,
+        "argv": sys.argv[1:],
+    }
+
+    if args.pg == "temp":
+        with temp_postgres() as dsn:
+            results = run_suite(args, dsn)
+    else:
+        results = run_suite(args, args.pg_dsn if args.pg == "dsn" else "")
+
+    out = Path(args.out) if args.out else PROJECT_ROOT / "benchmarks" / "results" / f"{commit}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    report = {"meta": meta, "results": results}
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print("OK:", out)
+
+    if args.compare:
+        old = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(old, report, args.threshold)
+        if regressions:
+            print("REGRESSIONS:")
+            for line in regressions:
+                print("  ", line)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
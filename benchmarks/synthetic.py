@@ -0,0 +1,166 @@
+# benchmarks/synthetic.py
+from __future__ import annotations
+
+import argparse
+import calendar
+import tempfile
+import zipfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+import yaml
+
+
+DEFAULT_VARS = ["t2m", "d2m", "tp", "u10", "v10", "swvl1", "swvl2"]
+
+
+def grid_axes(area: list[float], resolution: float) -> tuple[np.ndarray, np.ndarray]:
+    # area: [north, west, south, east], как в regions.yaml; широта убывает, как в ERA5
+    north, west, south, east = area
+    nlat = int(round((north - south) / resolution)) + 1
+    nlon = int(round((east - west) / resolution)) + 1
+    lat = np.round(north - np.arange(nlat) * resolution, 4)
+    lon = np.round(west + np.arange(nlon) * resolution, 4)
+    return lat, lon
+
+
+def make_dataset(
+    *,
+    area: list[float],
+    year: int,
+    month: int,
+    resolution: float = 0.1,
+    days: int | None = None,
+    variables: list[str] | None = None,
+    time_name: str = "valid_time",
+    seed: int = 0,
+) -> xr.Dataset:
+    """Синтетический месяц ERA5-Land: те же имена, единицы (K, м) и порядок осей."""
+    variables = variables or DEFAULT_VARS
+    n_days = calendar.monthrange(year, month)[1]
+    if days:
+        n_days = min(days, n_days)
+
+    times = pd.date_range(f"{year}-{month:02d}-01", periods=n_days * 24, freq="h")
+    lat, lon = grid_axes(area, resolution)
+    shape = (len(times), len(lat), len(lon))
+    rng = np.random.default_rng(seed)
+
+    hours = times.hour.to_numpy()[:, None, None]
+    diurnal = 5.0 * np.sin((hours - 9) / 24.0 * 2 * np.pi)
+    lat_grad = (lat.mean() - lat)[None, :, None] * 0.7
+    t2m = 273.15 + 5.0 + diurnal + lat_grad + rng.normal(0, 1.5, shape)
+
+    fields = {
+        "t2m": t2m,
+        "d2m": t2m - np.abs(rng.normal(4.0, 1.5, shape)),
+        # осадки: большинство часов сухие, в метрах
+        "tp": np.where(rng.random(shape) < 0.85, 0.0, rng.exponential(3e-4, shape)),
+        "u10": rng.normal(1.0, 3.0, shape),
+        "v10": rng.normal(0.0, 3.0, shape),
+        "swvl1": np.clip(rng.normal(0.30, 0.05, shape), 0.0, 0.6),
+        "swvl2": np.clip(rng.normal(0.32, 0.04, shape), 0.0, 0.6),
+    }
+
+    data_vars = {}
+    for v in variables:
+        arr = fields[v] if v in fields else rng.normal(0.0, 1.0, shape)
+        data_vars[v] = ((time_name, "latitude", "longitude"), arr.astype("float32"))
+
+    return xr.Dataset(
+        data_vars,
+        coords={time_name: times, "latitude": lat, "longitude": lon},
+        attrs={"Conventions": "CF-1.7", "institution": "synthetic"},
+    )
+
+
+def write_month(ds: xr.Dataset, out_file: Path, as_zip: bool = False) -> Path:
+    out_file.parent.mkdir(parents=True, exist_ok=True)
+    if not as_zip:
+        ds.to_netcdf(out_file)
+        return out_file
+
+    # так же, как отдаёт новый CDS: ZIP с data_0.nc внутри
+    with tempfile.TemporaryDirectory() as td:
+        nc = Path(td) / "data_0.nc"
+        ds.to_netcdf(nc)
+        with zipfile.ZipFile(out_file, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            zf.write(nc, "data_0.nc")
+    return out_file
+
+
+def generate_raw(
+    *,
+    raw_root: Path,
+    regions: dict[str, list[float]],
+    year: int,
+    months: list[int],
+    resolution: float = 0.1,
+    days: int | None = None,
+    variables: list[str] | None = None,
+    time_name: str = "valid_time",
+    as_zip: bool = False,
+    seed: int = 0,
+) -> list[Path]:
+    """Пишет файлы в ту же раскладку, что и download_era5_land: region=…/year=…/month=..(nc|zip)."""
+    out = []
+    for i, (region, area) in enumerate(regions.items()):
+        for m in months:
+            ds = make_dataset(
+                area=area,
+                year=year,
+                month=m,
+                resolution=resolution,
+                days=days,
+                variables=variables,
+                time_name=time_name,
+                seed=seed + i * 100 + m,
+            )
+            ext = "zip" if as_zip else "nc"
+            out_file = raw_root / f"region={region}" / f"year={year}" / f"month={m:02d}.{ext}"
+            out.append(write_month(ds, out_file, as_zip=as_zip))
+    return out
+
+
+def synthetic_regions(n: int, regions_yaml: str = "config/regions.yaml") -> dict[str, list[float]]:
+    # берём bbox реальных регионов по кругу, чтобы размер сетки был реалистичным
+    cfg = yaml.safe_load(Path(regions_yaml).read_text(encoding="utf-8"))
+    areas = [cfg[r]["area"] for r in cfg if cfg[r]["area"] != [0.0, 0.0, 0.0, 0.0]]
+    return {f"synth_{i:03d}": areas[i % len(areas)] for i in range(n)}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--year", type=int, default=2022)
+    ap.add_argument("--months", type=str, default="1")
+    ap.add_argument("--regions", type=int, default=4, help="сколько синтетических регионов")
+    ap.add_argument("--regions-yaml", type=str, default="config/regions.yaml")
+    ap.add_argument("--raw-root", type=str, default="data/synthetic/raw/era5-land")
+    ap.add_argument("--resolution", type=float, default=0.1)
+    ap.add_argument("--days", type=int, default=0, help="0 = весь месяц")
+    ap.add_argument("--vars", type=str, default=",".join(DEFAULT_VARS))
+    ap.add_argument("--time-name", choices=["valid_time", "time"], default="valid_time")
+    ap.add_argument("--zip", action="store_true")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    files = generate_raw(
+        raw_root=Path(args.raw_root),
+        regions=synthetic_regions(args.regions, args.regions_yaml),
+        year=args.year,
+        months=[int(x) for x in args.months.split(",") if x.strip()],
+        resolution=args.resolution,
+        days=args.days or None,
+        variables=[v.strip() for v in args.vars.split(",") if v.strip()],
+        time_name=args.time_name,
+        as_zip=args.zip,
+        seed=args.seed,
+    )
+    for f in files:
+        print("OK:", f)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+# common/instrumentation.py
+#
+# Лёгкая инструментация ETL: время (wall/CPU), память, байты и строки по стадиям и партициям.
+#
+#   with partition(region="krasnodar", year=2022, month=1):
+#       with stage("decode") as st:
+#           ...
+#           st.rows = len(df)
+#           st.bytes_read = path.stat().st_size
+#
+# Каждая стадия -> одна строка JSON в ETL_METRICS_PATH (по умолчанию data/metrics/stages.jsonl).
+# ETL_METRICS_PATH=off отключает запись. ETL_PROFILE=1 включает сэмплирующий профайлер на каждую стадию.
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+
+DEFAULT_METRICS_PATH = "data/metrics/stages.jsonl"
+DEFAULT_PROFILE_DIR = "data/metrics/profiles"
+
+_CONFIG = {
+    "metrics_path": os.getenv("ETL_METRICS_PATH", DEFAULT_METRICS_PATH),
+    "profile": os.getenv("ETL_PROFILE", "") not in ("", "0", "false", "off"),
+    "profile_dir": os.getenv("ETL_PROFILE_DIR", DEFAULT_PROFILE_DIR),
+    "run_id": os.getenv("ETL_RUN_ID") or time.strftime("%Y%m%dT%H%M%S-") + uuid.uuid4().hex[:6],
+    "script": Path(sys.argv[0]).stem if sys.argv and sys.argv[0] else "",
+    # False — стадии не трогают VmHWM: пик меряет внешний владелец (benchmarks/run.py на всю стадию бенча)
+    "reset_peak": True,
+}
+
+# записи текущего процесса — для сводного Prefect artifact; publish_artifact() их забирает и очищает,
+# иначе в долгоживущем процессе (flow в процессе, dask-драйвер) список рос бы и тащил записи прошлых запусков
+RECORDS: list[dict] = []
+
+_partition: contextvars.ContextVar[dict] = contextvars.ContextVar("etl_partition", default={})
+_depth: contextvars.ContextVar[int] = contextvars.ContextVar("etl_stage_depth", default=0)
+_collector: contextvars.ContextVar[list | None] = contextvars.ContextVar("etl_collector", default=None)
+
+# внешние стадии, идущие сейчас в процессе (flow гоняет их в потоках): VmHWM общий на процесс,
+# поэтому сбрасывать его можно, только если других стадий нет, а «свой» пик — если никто не стартовал рядом
+_active_lock = threading.Lock()
+_active = 0
+_started = 0
+
+
+def configure(**kwargs) -> dict:
+    """Переопределяет настройки (metrics_path, profile, profile_dir, run_id, script, reset_peak).
+
+    Возвращает полный конфиг — его можно передать в задачу на dask-воркере и вызвать configure(**cfg) там.
+    """
+    unknown = set(kwargs) - set(_CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown instrumentation options: {sorted(unknown)}")
+    _CONFIG.update({k: v for k, v in kwargs.items() if v is not None})
+    return dict(_CONFIG)
+
+
+def add_cli_args(ap) -> None:
+    ap.add_argument("--metrics-path", type=str, default=None, help="JSONL с метриками стадий ('off' = не писать)")
+    ap.add_argument("--profile", action="store_true", help="сэмплирующий профайлер на каждую стадию")
+
+
+def configure_from_args(args) -> dict:
+    return configure(metrics_path=args.metrics_path, profile=args.profile or None)
+
+
+# -------------------- память --------------------
+
+def rss_mb() -> float | None:
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def reset_peak() -> bool:
+    # linux >= 4.0: "5" сбрасывает VmHWM, дальше пик считается с этого момента
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_mb() -> float:
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # без /proc — пик за всё время жизни процесса
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 1024
+
+
+# -------------------- профайлер --------------------
+
+@contextmanager
+def _profiled(name: str, labels: dict):
+    if not _CONFIG["profile"]:
+        yield
+        return
+
+    out_dir = Path(_CONFIG["profile_dir"]) / _CONFIG["run_id"]
+    out_dir.mkdir(parents=True, exist_ok=True)
+    suffix = "_".join(f"{k}={v}" for k, v in labels.items())
+    base = out_dir / (f"{name}_{suffix}" if suffix else name)
+
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        # pyinstrument не установлен — детерминированный cProfile как запасной вариант
+        import cProfile
+
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            prof.dump_stats(str(base) + ".prof")
+        return
+
+    prof = Profiler(interval=0.005)
+    prof.start()
+    try:
+        yield
+    finally:
+        prof.stop()
+        Path(str(base) + ".html").write_text(prof.output_html(), encoding="utf-8")
+
+
+# -------------------- стадии --------------------
+
+class Stage:
+    """Счётчики стадии; заполняются внутри with stage(...)."""
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+        self.rows: int | None = None
+        self.bytes_read: int | None = None
+        self.bytes_written: int | None = None
+        self.extra: dict = {}
+
+
+@contextmanager
+def collect():
+    """Записи стадий внутри блока идут в отдельный список, а не в RECORDS.
+
+    Нужно для dask: воркер возвращает их вместе с результатом, драйвер добавляет в свои RECORDS.
+    """
+    records: list[dict] = []
+    token = _collector.set(records)
+    try:
+        yield records
+    finally:
+        _collector.reset(token)
+
+
+@contextmanager
+def partition(**labels):
+    """Метки партиции (region/year/month/...) для всех вложенных стадий."""
+    token = _partition.set({**_partition.get(), **labels})
+    try:
+        yield
+    finally:
+        _partition.reset(token)
+
+
+def _emit(record: dict) -> None:
+    collector = _collector.get()
+    if collector is not None:
+        collector.append(record)
+    else:
+        with _active_lock:  # тот же lock, что у publish_artifact: запись не потеряется между копией и clear()
+            RECORDS.append(record)
+    path = _CONFIG["metrics_path"]
+    if not path or path == "off":
+        return
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    # одна короткая строка на write в режиме append — безопасно для нескольких процессов
+    with p.open("a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+
+@contextmanager
+def stage(name: str, **labels):
+    labels = {**_partition.get(), **labels}
+    st = Stage(name, labels)
+
+    global _active, _started
+
+    depth = _depth.get()
+    # пик сбрасываем только у внешней стадии, иначе вложенная испортит пик внешней,
+    # и только если параллельно не идёт другая стадия
+    peak_reset = False
+    if depth == 0:
+        with _active_lock:
+            alone = _active == 0
+            _active += 1
+            _started += 1
+            my_start = _started
+        peak_reset = reset_peak() if alone and _CONFIG["reset_peak"] else False
+    depth_token = _depth.set(depth + 1)
+
+    rss0 = rss_mb()
+    # CPU — только этого потока: process_time() при параллельных стадиях суммирует чужое
+    t0, c0 = time.perf_counter(), time.thread_time()
+    error = None
+    try:
+        with _profiled(name, labels):
+            yield st
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        wall, cpu = time.perf_counter() - t0, time.thread_time() - c0
+        _depth.reset(depth_token)
+        if depth == 0:
+            with _active_lock:
+                _active -= 1
+                # кто-то стартовал, пока мы шли, — его память тоже попала в наш пик
+                overlapped = _started != my_start
+            peak_reset = peak_reset and not overlapped
+        rss1 = rss_mb()
+        record = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "run_id": _CONFIG["run_id"],
+            "script": _CONFIG["script"],
+            "stage": name,
+            **labels,
+            "wall_s": round(wall, 4),
+            "cpu_s": round(cpu, 4),
+            "peak_rss_mb": round(peak_mb(), 1),
+            "peak_is_stage_local": peak_reset,
+            "rss_delta_mb": round(rss1 - rss0, 1) if rss0 is not None and rss1 is not None else None,
+            "rows": st.rows,
+            "bytes_read": st.bytes_read,
+            "bytes_written": st.bytes_written,
+            "ok": error is None,
+        }
+        if error:
+            record["error"] = error
+        record.update(st.extra)
+        _emit(record)
+
+
+def file_size(path) -> int | None:
+    try:
+        return Path(path).stat().st_size
+    except OSError:
+        return None
+
+
+# -------------------- prefect --------------------
+
+def publish_artifact(records: list[dict] | None = None, key: str | None = None) -> bool:
+    """Сводная таблица стадий как Prefect artifact; вне flow/task run ничего не делает.
+
+    Без records берёт накопленные RECORDS и очищает их — даже если artifact не создан.
+    """
+    if records is None:
+        with _active_lock:
+            records = RECORDS[:]
+            RECORDS.clear()
+    if not records:
+        return False
+    try:
+        from prefect.artifacts import create_table_artifact
+        from prefect.context import get_run_context
+    except ImportError:
+        return False
+    try:
+        get_run_context()
+    except Exception:  # noqa: BLE001 — MissingContextError и т.п.: мы не внутри prefect run
+        return False
+
+    columns = ["stage", "region", "year", "month", "wall_s", "cpu_s", "peak_rss_mb", "rows", "bytes_read", "bytes_written", "ok"]
+    table = [{c: r.get(c) for c in columns} for r in records]
+    create_table_artifact(
+        table=table,
+        key=key or f"etl-stages-{_CONFIG['script'] or 'run'}".replace("_", "-").lower(),
+        description=f"ETL stage metrics, run_id={_CONFIG['run_id']}",
+    )
+    return True
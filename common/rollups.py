@@ -0,0 +1,197 @@
+# common/rollups.py
+#
+# Rollup-таблицы (неделя/месяц/сезон и т.п.) поверх витрин marts.era5_daily / marts.era5_hourly.
+# Loader'ы после каждого upsert пересчитывают только те корзины, в которые попали загруженные строки.
+# Дашборд через choose_grain подбирает таблицу под запрошенный диапазон.
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from datetime import date, timedelta
+
+import pandas as pd
+
+
+# сезон вегетации: [start, end) по месяцу/дню
+GROWING_SEASON = ((4, 1), (11, 1))
+
+# grain -> (начало корзины, конец корзины (исключительно), фильтр) — SQL по колонке t
+GRAINS = {
+    "day": ("date_trunc('day', t)::date", "(date_trunc('day', t) + interval '1 day')::date", None),
+    "week": ("date_trunc('week', t)::date", "(date_trunc('week', t) + interval '1 week')::date", None),
+    "month": ("date_trunc('month', t)::date", "(date_trunc('month', t) + interval '1 month')::date", None),
+    "season": (
+        "make_date(extract(year from t)::int, {sm}, {sd})",
+        "make_date(extract(year from t)::int, {em}, {ed})",
+        "t >= make_date(extract(year from t)::int, {sm}, {sd}) and t < make_date(extract(year from t)::int, {em}, {ed})",
+    ),
+}
+
+# приблизительная длина корзины в днях — для выбора детализации
+GRAIN_DAYS = {"hour": 1 / 24, "day": 1, "week": 7, "month": 30.4, "season": 365.25}
+
+ROLLUPS = {
+    "marts.era5_daily": {
+        "time_col": "day",
+        "native": "day",
+        "grains": ["week", "month", "season"],
+        "metrics": {
+            "t2m_mean": "avg",
+            "t2m_min": "min",
+            "t2m_max": "max",
+            "d2m_mean": "avg",
+            "tp_sum": "sum",
+            "swvl1_mean": "avg",
+            "swvl2_mean": "avg",
+            "wind_speed_10m_mean": "avg",
+        },
+    },
+    "marts.era5_hourly": {
+        "time_col": "ts",
+        "native": "hour",
+        "grains": ["day", "week", "month"],
+        "metrics": {
+            "t2m": "avg",
+            "d2m": "avg",
+            "tp": "sum",
+            "u10": "avg",
+            "v10": "avg",
+            "swvl1": "avg",
+            "swvl2": "avg",
+            "wind_speed_10m": "avg",
+        },
+    },
+}
+
+
+def rollup_table(source: str, grain: str) -> str:
+    return f"{source}_{grain}"
+
+
+def _grain_sql(grain: str) -> tuple[str, str, str | None]:
+    (sm, sd), (em, ed) = GROWING_SEASON
+    start, end, where = GRAINS[grain]
+    fmt = dict(sm=sm, sd=sd, em=em, ed=ed)
+    return start.format(**fmt), end.format(**fmt), where.format(**fmt) if where else None
+
+
+def _refresh_sql(source: str, grain: str, touched_sql: str) -> str:
+    spec = ROLLUPS[source]
+    start, end, where = _grain_sql(grain)
+    metrics = spec["metrics"]
+    t = spec["time_col"]
+
+    select_metrics = ", ".join(f"{fn}(s.{c}) AS {c}" for c, fn in metrics.items())
+    set_sql = ", ".join(f"{c}=EXCLUDED.{c}" for c in ["bucket_end", "n_rows", *metrics])
+
+    return f"""
+        WITH touched AS (
+            SELECT DISTINCT region, {start} AS bucket_start, {end} AS bucket_end
+            FROM ({touched_sql}) AS u(region, t)
+            {"WHERE " + where if where else ""}
+        )
+        INSERT INTO {rollup_table(source, grain)} (region, bucket_start, bucket_end, n_rows, {", ".join(metrics)})
+        SELECT b.region, b.bucket_start, b.bucket_end, count(*), {select_metrics}
+        FROM touched b
+        JOIN {source} s
+          ON s.region = b.region AND s.{t} >= b.bucket_start AND s.{t} < b.bucket_end
+        GROUP BY b.region, b.bucket_start, b.bucket_end
+        ON CONFLICT (region, bucket_start) DO UPDATE SET {set_sql};
+    """
+
+
+_warned: set[str] = set()
+
+
+def missing_rollups(conn, source: str) -> list[str]:
+    """Rollup-таблицы source, которых нет в БД (volume создан до 04_rollups.sql)."""
+    tables = [rollup_table(source, g) for g in ROLLUPS[source]["grains"]]
+    with conn.cursor() as cur:
+        cur.execute("SELECT t FROM unnest(%s::text[]) AS t WHERE to_regclass(t) IS NULL", (tables,))
+        return [r[0] for r in cur.fetchall()]
+
+
+def refresh_rollups(conn, source: str, df: pd.DataFrame) -> int:
+    """Пересчитывает корзины всех rollup'ов source, затронутые строками df. Возвращает число корзин.
+    Если rollup-таблиц нет — ничего не делает (с предупреждением), сама загрузка не падает.
+    """
+    spec = ROLLUPS.get(source)
+    if spec is None or df.empty:
+        return 0
+
+    missing = missing_rollups(conn, source)
+    if missing:
+        if source not in _warned:
+            _warned.add(source)
+            print(f"WARN: rollup tables missing ({', '.join(missing)}), skipping refresh; "
+                  f"apply docker/init/04_rollups.sql via psql -f", file=sys.stderr)
+        return 0
+
+    t = spec["time_col"]
+    keys = df[["region", t]].drop_duplicates()
+    regions = keys["region"].tolist()
+    times = pd.to_datetime(keys[t]).dt.to_pydatetime().tolist()
+
+    touched_sql = "SELECT * FROM unnest(%(regions)s::text[], %(times)s::timestamp[])"
+    n = 0
+    with conn.cursor() as cur:
+        for grain in spec["grains"]:
+            cur.execute(_refresh_sql(source, grain, touched_sql), {"regions": regions, "times": times})
+            n += cur.rowcount
+    conn.commit()
+    return n
+
+
+def rebuild_rollups(conn, source: str) -> int:
+    """Полный пересчёт (для данных, загруженных до появления rollup'ов)."""
+    spec = ROLLUPS[source]
+    t = spec["time_col"]
+    n = 0
+    with conn.cursor() as cur:
+        for grain in spec["grains"]:
+            # корзины считаются по distinct-значениям; для hourly сначала сжимаем до дней
+            touched_sql = f"SELECT DISTINCT region, date_trunc('day', {t})::timestamp FROM {source}"
+            cur.execute(_refresh_sql(source, grain, touched_sql))
+            n += cur.rowcount
+    conn.commit()
+    return n
+
+
+def choose_grain(source: str, start: date, end: date, n_regions: int = 1, max_points: int = 2000) -> str:
+    """Детализация для диапазона: native, если точек на графике не больше max_points, иначе первый rollup,
+    который укладывается в бюджет. "season" в авто-выборе не участвует — это отдельный режим сравнения.
+    """
+    spec = ROLLUPS[source]
+    days = (end - start + timedelta(days=1)).days
+    candidates = [spec["native"]] + [g for g in spec["grains"] if g != "season"]
+    for grain in candidates:
+        if days / GRAIN_DAYS[grain] * n_regions <= max_points:
+            return grain
+    return candidates[-1]
+
+
+def main():
+    import psycopg2
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rebuild", type=str, default="marts.era5_daily,marts.era5_hourly",
+                    help="полный пересчёт rollup'ов для перечисленных таблиц")
+    args = ap.parse_args()
+
+    conn = psycopg2.connect(
+        host=os.getenv("PGHOST", "127.0.0.1"),
+        port=int(os.getenv("PGPORT", "5432")),
+        dbname=os.getenv("PGDATABASE", "agri"),
+        user=os.getenv("PGUSER", "agri"),
+        password=os.getenv("PGPASSWORD", "agri"),
+    )
+    try:
+        for source in [s.strip() for s in args.rebuild.split(",") if s.strip()]:
+            print("OK:", source, rebuild_rollups(conn, source), "buckets")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
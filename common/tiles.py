@@ -0,0 +1,107 @@
+# common/tiles.py
+#
+# Пирамида тайлов поверх сеточной витрины (data/marts/grid): по времени — day/week/month,
+# по пространству — уровни z, на каждом ячейка в 2**z раз крупнее исходной (0.1° у ERA5-Land).
+# Тайл — квадрат TILE × TILE ячеек своего уровня; один parquet на (grain, z, корзина, тайл).
+# Строит aggregate_grid_tiles, читает дашборд — только тайлы, попавшие в видимый bbox.
+from __future__ import annotations
+
+import math
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+BASE_RES = 0.1
+TILE = 64
+LEVELS = [0, 1, 2, 3, 4]
+TIME_GRAINS = ["day", "week", "month"]
+
+# агрегат по времени — по суффиксу метрики (t2m_mean, tp_sum, ...); по пространству всегда среднее
+TIME_AGG = {"mean": "mean", "sum": "sum", "min": "min", "max": "max"}
+
+
+def bucket_start(day: date, grain: str) -> date:
+    if grain == "day":
+        return day
+    if grain == "week":
+        return day - timedelta(days=day.weekday())
+    if grain == "month":
+        return day.replace(day=1)
+    raise ValueError(f"unknown grain: {grain}")
+
+
+def bucket_end(start: date, grain: str) -> date:
+    """Конец корзины (исключительно)."""
+    if grain == "day":
+        return start + timedelta(days=1)
+    if grain == "week":
+        return start + timedelta(days=7)
+    y, m = (start.year + 1, 1) if start.month == 12 else (start.year, start.month + 1)
+    return date(y, m, 1)
+
+
+def res(z: int) -> float:
+    return BASE_RES * 2**z
+
+
+def cell_index(lat, lon, z: int = 0):
+    """Глобальные индексы ячеек уровня z: (i по широте от -90, j по долготе от -180)."""
+    i0 = np.rint((np.asarray(lat) + 90.0) / BASE_RES).astype(np.int64)
+    j0 = np.rint((np.asarray(lon) + 180.0) / BASE_RES).astype(np.int64)
+    return i0 >> z, j0 >> z
+
+
+def cell_center(i, j, z: int):
+    # блок уровня z накрывает исходные i0 в [i*2**z, (i+1)*2**z) — центр посередине
+    k = 2**z
+    lat = (np.asarray(i) * k + (k - 1) / 2) * BASE_RES - 90.0
+    lon = (np.asarray(j) * k + (k - 1) / 2) * BASE_RES - 180.0
+    return lat, lon
+
+
+def tile_path(root: Path, grain: str, z: int, bucket: date, ty: int, tx: int) -> Path:
+    return root / f"grain={grain}" / f"z={z}" / f"bucket={bucket.isoformat()}" / f"tile={ty}_{tx}.parquet"
+
+
+def tiles_for_bbox(bbox: tuple[float, float, float, float], z: int) -> list[tuple[int, int]]:
+    """Тайлы уровня z, пересекающие bbox = (north, west, south, east) — в формате area из regions.yaml."""
+    north, west, south, east = bbox
+    i_lo, j_lo = cell_index(south, west, z)
+    i_hi, j_hi = cell_index(north, east, z)
+    return [
+        (ty, tx)
+        for ty in range(int(i_lo) // TILE, int(i_hi) // TILE + 1)
+        for tx in range(int(j_lo) // TILE, int(j_hi) // TILE + 1)
+    ]
+
+
+def cells_in_bbox(bbox: tuple[float, float, float, float], z: int) -> int:
+    north, west, south, east = bbox
+    return math.ceil((north - south) / res(z) + 1) * math.ceil((east - west) / res(z) + 1)
+
+
+def choose_level(bbox: tuple[float, float, float, float], max_cells: int = 20_000, levels: list[int] | None = None) -> int:
+    """Самый детальный уровень, на котором в bbox не больше max_cells ячеек."""
+    levels = sorted(levels if levels is not None else LEVELS)
+    for z in levels:
+        if cells_in_bbox(bbox, z) <= max_cells:
+            return z
+    return levels[-1]
+
+
+def available_levels(root: Path, grain: str) -> list[int]:
+    return sorted(int(p.name.removeprefix("z=")) for p in (root / f"grain={grain}").glob("z=*"))
+
+
+def coarsen(cells: pd.DataFrame, z: int, metrics: list[str]) -> pd.DataFrame:
+    """Ячейки уровня 0 (lat, lon, метрики) -> уровень z: среднее по блоку 2**z × 2**z, n_cells — сколько исходных с данными."""
+    i, j = cell_index(cells["lat"].to_numpy(), cells["lon"].to_numpy(), z)
+    g = cells[metrics].assign(i=i, j=j).groupby(["i", "j"])
+    out = g[metrics].mean()
+    out.insert(0, "n_cells", g.size())
+    out = out.reset_index()
+    out["lat"], out["lon"] = cell_center(out["i"].to_numpy(), out["j"].to_numpy(), z)
+    return out[["i", "j", "lat", "lon", "n_cells", *metrics]]
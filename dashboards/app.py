@@ -2,12 +2,33 @@
 from __future__ import annotations
 
 import os
+import sys
 from datetime import datetime, date
+from pathlib import Path
 
+import numpy as np
 import pandas as pd
+import pydeck as pdk
 import streamlit as st
+import yaml
 from sqlalchemy import create_engine, text
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.rollups import ROLLUPS, choose_grain, rollup_table  # noqa: E402
+from common.tiles import (  # noqa: E402
+    TIME_GRAINS,
+    available_levels,
+    bucket_start,
+    choose_level,
+    res,
+    tile_path,
+    tiles_for_bbox,
+)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+TILES_ROOT = Path(os.getenv("GRID_TILES_ROOT", PROJECT_ROOT / "data/marts/grid_tiles"))
+MAP_MAX_CELLS = 20_000
+
 
 st.set_page_config(page_title="ERA5-Land Dashboard", layout="wide")
 
@@ -29,16 +50,31 @@ def load_regions() -> list[str]:
         return [r[0] for r in c.execute(q).fetchall()]
 
 
-@st.cache_data(ttl=60)
-def load_daily(regions: list[str], start: date, end: date) -> pd.DataFrame:
-    eng = create_engine(pg_url())
-    q = text("""
-        select *
-        from marts.era5_daily
+def rollup_query(source: str, grain: str, time_col: str):
+    # корзины, пересекающиеся с [start, end]; bucket_start подставляется вместо native-колонки времени
+    metrics = ", ".join(ROLLUPS[source]["metrics"])
+    return text(f"""
+        select region, bucket_start as {time_col}, n_rows, {metrics}
+        from {rollup_table(source, grain)}
         where region = any(:regions)
-          and day between :start and :end
-        order by region, day;
+          and bucket_end > :start and bucket_start <= :end
+        order by region, bucket_start;
     """)
+
+
+@st.cache_data(ttl=60)
+def load_daily(regions: list[str], start: date, end: date, grain: str = "day") -> pd.DataFrame:
+    eng = create_engine(pg_url())
+    if grain == "day":
+        q = text("""
+            select *
+            from marts.era5_daily
+            where region = any(:regions)
+              and day between :start and :end
+            order by region, day;
+        """)
+    else:
+        q = rollup_query("marts.era5_daily", grain, "day")
     with eng.connect() as c:
         df = pd.read_sql(q, c, params={"regions": regions, "start": start, "end": end})
     df["day"] = pd.to_datetime(df["day"])
@@ -46,21 +82,97 @@ def load_daily(regions: list[str], start: date, end: date) -> pd.DataFrame:
 
 
 @st.cache_data(ttl=60)
-def load_hourly(regions: list[str], start_dt: datetime, end_dt: datetime) -> pd.DataFrame:
+def load_hourly(regions: list[str], start_dt: datetime, end_dt: datetime, grain: str = "hour") -> pd.DataFrame:
     eng = create_engine(pg_url())
-    q = text("""
-        select *
-        from marts.era5_hourly
-        where region = any(:regions)
-          and ts between :start_dt and :end_dt
-        order by region, ts;
-    """)
+    if grain == "hour":
+        q = text("""
+            select *
+            from marts.era5_hourly
+            where region = any(:regions)
+              and ts between :start and :end
+            order by region, ts;
+        """)
+    else:
+        q = rollup_query("marts.era5_hourly", grain, "ts")
     with eng.connect() as c:
-        df = pd.read_sql(q, c, params={"regions": regions, "start_dt": start_dt, "end_dt": end_dt})
+        df = pd.read_sql(q, c, params={"regions": regions, "start": start_dt, "end": end_dt})
     df["ts"] = pd.to_datetime(df["ts"])
     return df
 
 
+@st.cache_data(ttl=60)
+def load_anomaly(regions: list[str], start: date, end: date, metric: str) -> pd.DataFrame:
+    # норма заранее посчитана (marts.era5_climatology), здесь только join по PK (region, metric, doy)
+    eng = create_engine(pg_url())
+    q = text(f"""
+        select d.region, d.day, d.{metric} as value,
+               c.mean, c.p10, c.p90,
+               d.{metric} - c.mean as anomaly,
+               (d.{metric} - c.mean) / nullif(c.std, 0) as zscore
+        from marts.era5_daily d
+        join marts.era5_climatology c
+          on c.region = d.region and c.metric = :metric and c.doy = marts.doy365(d.day)
+        where d.region = any(:regions)
+          and d.day between :start and :end
+        order by d.region, d.day;
+    """)
+    with eng.connect() as c:
+        df = pd.read_sql(q, c, params={"regions": regions, "start": start, "end": end, "metric": metric})
+    df["day"] = pd.to_datetime(df["day"])
+    return df
+
+
+@st.cache_data
+def load_region_areas() -> dict[str, list[float]]:
+    cfg = yaml.safe_load((PROJECT_ROOT / "config/regions.yaml").read_text(encoding="utf-8"))
+    return {r: v["area"] for r, v in cfg.items()}
+
+
+@st.cache_data(max_entries=4096)
+def load_tile(path: str, mtime_ns: int) -> pd.DataFrame:
+    # mtime в ключе: перестроенный тайл перечитается, остальные берутся из кэша
+    return pd.read_parquet(path)
+
+
+def load_map_cells(grain: str, z: int, bucket: date, bbox: tuple[float, float, float, float]) -> pd.DataFrame:
+    # только тайлы, пересекающие bbox, — объём чтения не зависит от размера витрины
+    parts = []
+    for ty, tx in tiles_for_bbox(bbox, z):
+        p = tile_path(TILES_ROOT, grain, z, bucket, ty, tx)
+        if p.exists():
+            parts.append(load_tile(str(p), p.stat().st_mtime_ns))
+    if not parts:
+        return pd.DataFrame()
+    df = pd.concat(parts, ignore_index=True)
+    # по пересечению ячейки с bbox, а не по центру: на грубых уровнях ячейка крупнее края региона
+    north, west, south, east = bbox
+    h = res(z) / 2
+    return df[
+        (df["lat"] + h >= south) & (df["lat"] - h <= north)
+        & (df["lon"] + h >= west) & (df["lon"] - h <= east)
+    ]
+
+
+def colorize(values: pd.Series) -> list[list[int]]:
+    # синий -> белый -> красный по 2..98 перцентилю видимых значений
+    lo, hi = np.nanpercentile(values, [2, 98])
+    t = np.clip((values.to_numpy() - lo) / ((hi - lo) or 1.0), 0.0, 1.0)
+    r = 255 * np.minimum(1.0, 2 * t)
+    b = 255 * np.minimum(1.0, 2 * (1 - t))
+    g = 255 * (1 - np.abs(2 * t - 1))
+    return np.stack([r, g, b, np.full_like(t, 180)], axis=1).astype(int).tolist()
+
+
+def grain_picker(source: str, key: str, start: date, end: date, n_regions: int) -> str:
+    spec = ROLLUPS[source]
+    options = ["авто", spec["native"], *spec["grains"]]
+    picked = st.selectbox("Детализация", options, index=0, key=key)
+    grain = choose_grain(source, start, end, n_regions) if picked == "авто" else picked
+    table = source if grain == spec["native"] else rollup_table(source, grain)
+    st.caption(f"Источник: {table}")
+    return grain
+
+
 def wide_series(df: pd.DataFrame, time_col: str, metric: str) -> pd.DataFrame:
     if metric not in df.columns:
         return pd.DataFrame()
@@ -102,7 +214,7 @@ with st.sidebar:
     st.caption("Берётся из env: PGHOST/PGPORT/PGDATABASE/PGUSER/PGPASSWORD")
 
 
-tab_daily, tab_hourly = st.tabs(["Daily (дни)", "Hourly (часы)"])
+tab_daily, tab_hourly, tab_map = st.tabs(["Daily (дни)", "Hourly (часы)", "Карта (сетка)"])
 
 # -------------------- DAILY --------------------
 with tab_daily:
@@ -116,13 +228,15 @@ with tab_daily:
         "wind_speed_10m_mean",
     ]
 
-    left, right = st.columns([2, 1])
+    left, mid, right = st.columns([2, 1, 1])
     with left:
         metric = st.selectbox("Метрика для сравнения регионов", daily_metrics, index=daily_metrics.index("t2m_mean"))
+    with mid:
+        grain = grain_picker("marts.era5_daily", "grain_daily", d1, d2, len(regions))
     with right:
         show_table = st.checkbox("Показать таблицу", value=False)
 
-    df = load_daily(regions, d1, d2)
+    df = load_daily(regions, d1, d2, grain)
     if df.empty:
         st.warning("Нет данных daily за выбранный период.")
     else:
@@ -140,6 +254,24 @@ with tab_daily:
             # st.bar_chart умеет рисовать wide dataframe
             st.bar_chart(tp)
 
+        st.divider()
+        if st.checkbox("Аномалия относительно климатической нормы", value=False):
+            try:
+                an = load_anomaly(regions, d1, d2, metric)
+            except Exception as e:
+                an = pd.DataFrame()
+                st.caption(f"Норма недоступна: {e}")
+            if an.empty:
+                st.info("Нет климатической нормы для выбранной метрики (см. aggregate_climatology).")
+            else:
+                st.subheader(f"Отклонение {metric} от нормы")
+                st.line_chart(wide_series(an, "day", "anomaly"))
+                st.subheader("z-score")
+                st.line_chart(wide_series(an, "day", "zscore"))
+                if len(regions) == 1:
+                    st.subheader("Значение и норма (p10–p90)")
+                    st.line_chart(an.set_index("day")[["value", "mean", "p10", "p90"]])
+
         if show_table:
             st.subheader("Raw daily (из БД)")
             st.dataframe(df, width="stretch")
@@ -156,16 +288,18 @@ with tab_hourly:
         "u10", "v10",
     ]
 
-    left, right = st.columns([2, 1])
+    left, mid, right = st.columns([2, 1, 1])
     with left:
         metric_h = st.selectbox("Метрика для сравнения регионов", hourly_metrics, index=hourly_metrics.index("t2m"))
+    with mid:
+        grain_h = grain_picker("marts.era5_hourly", "grain_hourly", d1, d2, len(regions))
     with right:
         show_table_h = st.checkbox("Показать таблицу (hourly)", value=False)
 
     start_dt = datetime.combine(d1, datetime.min.time())
     end_dt = datetime.combine(d2, datetime.max.time())
 
-    dfh = load_hourly(regions, start_dt, end_dt)
+    dfh = load_hourly(regions, start_dt, end_dt, grain_h)
     if dfh.empty:
         st.warning("Нет данных hourly за выбранный период.")
     else:
@@ -185,3 +319,72 @@ with tab_hourly:
         if show_table_h:
             st.subheader("Raw hourly (из БД)")
             st.dataframe(dfh, width="stretch")
+
+# -------------------- MAP --------------------
+with tab_map:
+    st.subheader("Сетка по ячейкам (data/marts/grid_tiles)")
+
+    c1, c2, c3, c4 = st.columns(4)
+    with c1:
+        metric_m = st.selectbox("Метрика", daily_metrics, index=daily_metrics.index("swvl1_mean"), key="metric_map")
+    with c2:
+        grain_m = st.selectbox("Период", TIME_GRAINS, index=0, key="grain_map")
+    with c3:
+        day_m = st.date_input("Дата", value=d1, min_value=d1, max_value=d2, key="day_map")
+
+    levels = available_levels(TILES_ROOT, grain_m)
+    areas = load_region_areas()
+    boxes = [areas[r] for r in regions if r in areas]
+    if not levels:
+        st.info("Нет тайлов: aggregate_hourly --grid-root, затем aggregate_grid_tiles.")
+    elif not boxes:
+        st.info("Для выбранных регионов нет bbox в config/regions.yaml — карта недоступна.")
+    else:
+        bbox = (
+            max(b[0] for b in boxes), min(b[1] for b in boxes),
+            min(b[2] for b in boxes), max(b[3] for b in boxes),
+        )
+        with c4:
+            picked = st.selectbox("Детализация", ["авто", *levels], index=0, key="level_map")
+        z = choose_level(bbox, MAP_MAX_CELLS, levels) if picked == "авто" else picked
+        bucket = bucket_start(day_m, grain_m)
+
+        cells = load_map_cells(grain_m, z, bucket, bbox)
+        cells = cells.dropna(subset=[metric_m]) if metric_m in cells.columns else pd.DataFrame()
+        st.caption(
+            f"Уровень z={z} (ячейка {res(z):.1f}°), корзина {grain_m} {bucket}, "
+            f"тайлов {len(tiles_for_bbox(bbox, z))}, ячеек {len(cells)}"
+        )
+
+        if cells.empty:
+            st.warning("Нет сеточных данных на эту дату.")
+        else:
+            h = res(z) / 2
+            cells = cells.assign(
+                polygon=[[[x - h, y - h], [x + h, y - h], [x + h, y + h], [x - h, y + h]]
+                         for y, x in zip(cells["lat"], cells["lon"])],
+                color=colorize(cells[metric_m]),
+                value=cells[metric_m].round(3),
+            )
+            north, west, south, east = bbox
+            view = pdk.ViewState(
+                latitude=(north + south) / 2,
+                longitude=(west + east) / 2,
+                zoom=float(np.clip(np.log2(360 / max(east - west, 0.1)) - 0.5, 1, 12)),
+            )
+            layer = pdk.Layer(
+                "PolygonLayer",
+                cells[["polygon", "color", "value", "lat", "lon", "n_cells"]],
+                get_polygon="polygon",
+                get_fill_color="color",
+                stroked=False,
+                pickable=True,
+            )
+            st.pydeck_chart(pdk.Deck(
+                layers=[layer],
+                initial_view_state=view,
+                map_style=None,
+                tooltip={"text": f"{metric_m}: {{value}}\n{{lat}}, {{lon}} (ячеек: {{n_cells}})"},
+            ))
+            lo, hi = np.nanpercentile(cells[metric_m], [2, 98])
+            st.caption(f"Шкала: синий {lo:.2f} → красный {hi:.2f}")
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.instrumentation import (  # noqa: E402
+    add_cli_args,
+    configure_from_args,
+    file_size,
+    partition,
+    publish_artifact,
+    stage,
+)
+
+
+QUANTILES = {"p10": 0.10, "p50": 0.50, "p90": 0.90}
+
+
+def doy365(day: pd.Series) -> pd.Series:
+    """День года без 29 февраля: 29.02 -> 59 (как 28.02), дальше сдвиг на 1 в високосный год.
+
+    Та же формула в SQL — функция marts.doy365 (docker/init/05_climatology.sql).
+    """
+    day = pd.to_datetime(day)
+    doy = day.dt.dayofyear
+    return (doy - (day.dt.is_leap_year & (doy >= 60)).astype(int)).astype(int)
+
+
+# -------------------- сэмплы по годам --------------------
+
+def _year_inputs(daily_root: Path, year: int) -> list[Path]:
+    return sorted((daily_root / f"year={year}").glob("month=*.parquet"))
+
+
+def _digest(paths: list[Path]) -> str:
+    h = hashlib.sha256()
+    for p in paths:
+        st = p.stat()
+        h.update(f"{p.name}:{st.st_size}:{st.st_mtime_ns}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def year_samples(daily_root: Path, year: int) -> pd.DataFrame:
+    """Daily за год в длинном виде: region, metric, doy, value."""
+    parts = [pd.read_parquet(p) for p in _year_inputs(daily_root, year)]
+    df = pd.concat(parts, ignore_index=True)
+    df["doy"] = doy365(df["day"])
+    metrics = [c for c in df.columns if c not in ("region", "day", "doy") and pd.api.types.is_numeric_dtype(df[c])]
+    long = df.melt(id_vars=["region", "doy"], value_vars=metrics, var_name="metric", value_name="value")
+    long = long.dropna(subset=["value"])
+    long["year"] = year
+    return long[["region", "metric", "doy", "year", "value"]]
+
+
+def refresh_year(daily_root: Path, out_root: Path, year: int) -> bool:
+    """Пересобирает компактные сэмплы года, если его daily изменились. True — если пересобрали."""
+    inputs = _year_inputs(daily_root, year)
+    years_dir = out_root / "_years"
+    sample_file = years_dir / f"year={year}.parquet"
+    meta_file = years_dir / f"year={year}.json"
+
+    digest = _digest(inputs) if inputs else ""
+    if sample_file.exists() and meta_file.exists():
+        if json.loads(meta_file.read_text(encoding="utf-8")).get("digest") == digest:
+            return False
+
+    years_dir.mkdir(parents=True, exist_ok=True)
+    with stage("climatology_year", year=year) as st:
+        samples = year_samples(daily_root, year)
+        samples.to_parquet(sample_file, index=False)
+        st.rows = len(samples)
+        st.bytes_read = sum(file_size(p) or 0 for p in inputs)
+        st.bytes_written = file_size(sample_file)
+    meta_file.write_text(json.dumps({"digest": digest, "inputs": [p.name for p in inputs]}), encoding="utf-8")
+    return True
+
+
+# -------------------- климатология --------------------
+
+def climatology_for_region(samples: pd.DataFrame, window: int) -> pd.DataFrame:
+    """mean/std/перцентили по (metric, doy) с окном ±window//2 дней (по кругу через Новый год)."""
+    half = window // 2
+    doy0 = samples["doy"].to_numpy() - 1
+    expanded = pd.concat(
+        [samples.assign(doy=(doy0 + off) % 365 + 1) for off in range(-half, half + 1)],
+        ignore_index=True,
+    )
+
+    g = expanded.groupby(["metric", "doy"])
+    out = g.agg(n=("value", "count"), n_years=("year", "nunique"), mean=("value", "mean"), std=("value", "std"))
+    q = g["value"].quantile(list(QUANTILES.values())).unstack()
+    q.columns = list(QUANTILES.keys())
+    return out.join(q).reset_index()
+
+
+def build_climatology(out_root: Path, ref_start: int | None, ref_end: int | None, window: int) -> Path | None:
+    files = sorted((out_root / "_years").glob("year=*.parquet"))
+    years = [int(p.stem.removeprefix("year=")) for p in files]
+    picked = [
+        p for p, y in zip(files, years)
+        if (ref_start is None or y >= ref_start) and (ref_end is None or y <= ref_end)
+    ]
+    if not picked:
+        return None
+
+    samples = pd.concat([pd.read_parquet(p) for p in picked], ignore_index=True)
+    used_years = sorted(samples["year"].unique())
+
+    parts = []
+    for region, grp in samples.groupby("region"):
+        with partition(region=region), stage("climatology") as st:
+            clim = climatology_for_region(grp, window)
+            clim.insert(0, "region", region)
+            st.rows = len(clim)
+        parts.append(clim)
+
+    clim = pd.concat(parts, ignore_index=True)
+    clim["ref_start"] = int(used_years[0])
+    clim["ref_end"] = int(used_years[-1])
+    clim["window"] = window
+    clim = clim.replace([np.inf, -np.inf], np.nan)
+
+    out_file = out_root / "climatology.parquet"
+    clim.to_parquet(out_file, index=False)
+    return out_file
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--daily-root", type=str, default="data/marts/daily")
+    ap.add_argument("--out-root", type=str, default="data/marts/climatology")
+    ap.add_argument("--years", type=str, default="", help="какие годы обновить; пусто = все из daily-root")
+    ap.add_argument("--ref-start", type=int, default=None, help="первый год опорного периода (по умолчанию — все)")
+    ap.add_argument("--ref-end", type=int, default=None)
+    ap.add_argument("--window", type=int, default=15, help="окно сглаживания в днях (центрированное)")
+    add_cli_args(ap)
+    args = ap.parse_args()
+    configure_from_args(args)
+
+    daily_root = Path(args.daily_root)
+    out_root = Path(args.out_root)
+
+    if args.years.strip():
+        years = [int(x) for x in args.years.split(",") if x.strip()]
+    else:
+        years = sorted(int(p.name.removeprefix("year=")) for p in daily_root.glob("year=*") if p.is_dir())
+
+    for y in years:
+        if not _year_inputs(daily_root, y):
+            print("SKIP year (no daily parquet):", y)
+            continue
+        print("REFRESHED:" if refresh_year(daily_root, out_root, y) else "UNCHANGED:", y)
+
+    out_file = build_climatology(out_root, args.ref_start, args.ref_end, args.window)
+    if out_file is None:
+        print("No years in reference period.")
+        return
+    print("OK:", out_file)
+
+    publish_artifact()
+
+
+if __name__ == "__main__":
+    main()
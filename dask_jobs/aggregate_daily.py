@@ -1,10 +1,21 @@
 from __future__ import annotations
 
 import argparse
+import sys
 from pathlib import Path
 
 import pandas as pd
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.instrumentation import (  # noqa: E402
+    add_cli_args,
+    configure_from_args,
+    file_size,
+    partition,
+    publish_artifact,
+    stage,
+)
+
 
 AGG_SPECS = {
     "t2m": ["mean", "min", "max"],
@@ -50,13 +61,43 @@ def aggregate_one_month(hourly_path: Path) -> pd.DataFrame:
     return g
 
 
+def build_month(hourly_root: Path, out_root: Path, year: int, month: int) -> Path | None:
+    """Daily-витрина за месяц по всем регионам, у которых есть hourly parquet. None — если hourly нет."""
+    hourly_files = sorted(hourly_root.glob(f"region=*/year={year}/month={month:02d}.parquet"))
+    if not hourly_files:
+        return None
+
+    daily_parts = []
+    for hp in hourly_files:
+        region = hp.parent.parent.name.removeprefix("region=")
+        with stage("daily_agg", region=region, year=year, month=month) as st:
+            part = aggregate_one_month(hp)
+            st.bytes_read = file_size(hp)
+            st.rows = len(part)
+        daily_parts.append(part)
+
+    daily_df = pd.concat(daily_parts, ignore_index=True)
+
+    # сохраняем один файл на месяц (все регионы внутри)
+    out_dir = out_root / f"year={year}"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_file = out_dir / f"month={month:02d}.parquet"
+    with partition(year=year, month=month), stage("parquet_write") as st:
+        daily_df.to_parquet(out_file, index=False)
+        st.rows = len(daily_df)
+        st.bytes_written = file_size(out_file)
+    return out_file
+
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--year", type=int, required=True)
     ap.add_argument("--months", type=str, default="1")
     ap.add_argument("--hourly-root", type=str, default="data/marts/hourly")
     ap.add_argument("--out-root", type=str, default="data/marts/daily")
+    add_cli_args(ap)
     args = ap.parse_args()
+    configure_from_args(args)
 
     months = [int(x) for x in args.months.split(",") if x.strip()]
     hourly_root = Path(args.hourly_root)
@@ -64,24 +105,14 @@ def main():
 
     for m in months:
         # собираем все регионы за месяц
-        hourly_files = list(hourly_root.glob(f"region=*/year={args.year}/month={m:02d}.parquet"))
-        if not hourly_files:
+        out_file = build_month(hourly_root, out_root, args.year, m)
+        if out_file is None:
             print("SKIP month (no hourly parquet):", m)
             continue
-
-        daily_parts = []
-        for hp in hourly_files:
-            daily_parts.append(aggregate_one_month(hp))
-
-        daily_df = pd.concat(daily_parts, ignore_index=True)
-
-        # сохраняем один файл на месяц (все регионы внутри)
-        out_dir = out_root / f"year={args.year}"
-        out_dir.mkdir(parents=True, exist_ok=True)
-        out_file = out_dir / f"month={m:02d}.parquet"
-        daily_df.to_parquet(out_file, index=False)
         print("OK:", out_file)
 
+    publish_artifact()
+
 
 if __name__ == "__main__":
     main()
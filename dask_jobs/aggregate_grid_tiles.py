@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.instrumentation import (  # noqa: E402
+    add_cli_args,
+    configure_from_args,
+    file_size,
+    publish_artifact,
+    stage,
+)
+from common.tiles import (  # noqa: E402
+    LEVELS,
+    TILE,
+    TIME_AGG,
+    TIME_GRAINS,
+    bucket_end,
+    bucket_start,
+    cell_center,
+    cell_index,
+    coarsen,
+    tile_path,
+)
+
+
+def _months_between(start: date, end: date) -> list[tuple[int, int]]:
+    """(year, month) всех месяцев, пересекающих [start, end)."""
+    out, y, m = [], start.year, start.month
+    while date(y, m, 1) < end:
+        out.append((y, m))
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return out
+
+
+def read_grid(grid_root: Path, start: date, end: date) -> pd.DataFrame:
+    """Сеточные daily всех регионов за [start, end); ячейки, попавшие в несколько регионов, усредняются."""
+    files = [
+        p
+        for y, m in _months_between(start, end)
+        for p in sorted(grid_root.glob(f"region=*/year={y}/month={m:02d}.parquet"))
+    ]
+    if not files:
+        return pd.DataFrame()
+
+    df = pd.concat([pd.read_parquet(p) for p in files], ignore_index=True)
+    df = df[(df["day"] >= start) & (df["day"] < end)]
+
+    # ключ ячейки — целочисленный индекс, а не float-координаты
+    i, j = cell_index(df["lat"].to_numpy(), df["lon"].to_numpy(), 0)
+    metrics = [c for c in df.columns if c not in ("day", "lat", "lon")]
+    df = df[["day", *metrics]].assign(i=i, j=j).groupby(["day", "i", "j"], as_index=False)[metrics].mean()
+    df["lat"], df["lon"] = cell_center(df["i"].to_numpy(), df["j"].to_numpy(), 0)
+    return df
+
+
+def _time_agg(cells: pd.DataFrame, metrics: list[str]) -> pd.DataFrame:
+    agg = {m: TIME_AGG.get(m.rsplit("_", 1)[-1], "mean") for m in metrics}
+    g = cells.groupby(["i", "j"])
+    out = g.agg({"lat": "first", "lon": "first", **agg})
+    # сумма по одним NaN -> NaN, а не 0
+    sums = [m for m, fn in agg.items() if fn == "sum"]
+    out[sums] = out[sums].where(g[sums].count() > 0)
+    return out.reset_index()
+
+
+def write_bucket(tiles_root: Path, grain: str, bucket: date, cells: pd.DataFrame, levels: list[int]) -> tuple[int, int]:
+    """Все уровни и тайлы одной корзины -> (файлов, байт). Тайлы, которые больше не покрыты данными, удаляются."""
+    metrics = [c for c in cells.columns if c not in ("day", "i", "j", "lat", "lon")]
+    n_days = cells["day"].nunique()
+    per_cell = _time_agg(cells, metrics)
+
+    n_files = n_bytes = 0
+    for z in levels:
+        level = coarsen(per_cell, z, metrics)
+        level["n_days"] = n_days
+        ty, tx = level["i"] // TILE, level["j"] // TILE
+
+        bucket_dir = tile_path(tiles_root, grain, z, bucket, 0, 0).parent
+        bucket_dir.mkdir(parents=True, exist_ok=True)
+        written = set()
+        for (y, x), tile in level.groupby([ty, tx]):
+            out = tile_path(tiles_root, grain, z, bucket, int(y), int(x))
+            tile.reset_index(drop=True).to_parquet(out, index=False)
+            written.add(out.name)
+            n_bytes += file_size(out) or 0
+        for stale in bucket_dir.glob("tile=*.parquet"):
+            if stale.name not in written:
+                stale.unlink()
+        n_files += len(written)
+    return n_files, n_bytes
+
+
+def build_tiles(grid_root: Path, tiles_root: Path, year: int, month: int,
+                grains: list[str], levels: list[int]) -> int:
+    """Пересобирает корзины всех grain'ов, задетые месяцем (неделя на стыке месяцев — целиком)."""
+    m_start = date(year, month, 1)
+    m_end = bucket_end(m_start, "month")
+
+    # недели на краях месяца захватывают соседние месяцы — читаем и их
+    lo, hi = m_start, m_end
+    if "week" in grains:
+        lo = bucket_start(m_start, "week")
+        hi = bucket_end(bucket_start(m_end - timedelta(days=1), "week"), "week")
+
+    with stage("grid_read", year=year, month=month) as st:
+        cells = read_grid(grid_root, lo, hi)
+        st.rows = len(cells)
+    if cells.empty:
+        return 0
+
+    n = 0
+    for grain in grains:
+        starts = {d: bucket_start(d, grain) for d in cells["day"].unique()}
+        bucket = cells["day"].map(starts)
+        touched = sorted({b for d, b in starts.items() if m_start <= d < m_end})
+        for b in touched:
+            with stage("grid_tiles", grain=grain, bucket=b.isoformat()) as st:
+                part = cells[bucket == b]
+                files, st.bytes_written = write_bucket(tiles_root, grain, b, part, levels)
+                st.rows = len(part)
+                st.extra["tiles"] = files
+            n += files
+    return n
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--year", type=int, required=True)
+    ap.add_argument("--months", type=str, default="1")
+    ap.add_argument("--grid-root", type=str, default="data/marts/grid")
+    ap.add_argument("--tiles-root", type=str, default="data/marts/grid_tiles")
+    ap.add_argument("--grains", type=str, default=",".join(TIME_GRAINS))
+    ap.add_argument("--levels", type=str, default=",".join(map(str, LEVELS)),
+                    help="пространственные уровни: ячейка уровня z = 2**z исходных по каждой оси")
+    add_cli_args(ap)
+    args = ap.parse_args()
+    configure_from_args(args)
+
+    months = [int(x) for x in args.months.split(",") if x.strip()]
+    grains = [g.strip() for g in args.grains.split(",") if g.strip()]
+    levels = sorted(int(z) for z in args.levels.split(",") if z.strip())
+
+    for m in months:
+        n = build_tiles(Path(args.grid_root), Path(args.tiles_root), args.year, m, grains, levels)
+        print(f"OK: {args.year}-{m:02d} {n} tiles" if n else f"SKIP (no grid): {args.year}-{m:02d}")
+
+    publish_artifact()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
 import argparse
+import sys
 import tempfile
 import zipfile
+from contextlib import contextmanager
 from pathlib import Path
 
 import numpy as np
@@ -11,19 +13,34 @@ import xarray as xr
 import yaml
 from dask.distributed import Client
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.instrumentation import (  # noqa: E402
+    RECORDS,
+    add_cli_args,
+    collect,
+    configure,
+    configure_from_args,
+    file_size,
+    partition,
+    publish_artifact,
+    stage,
+)
+from dask_jobs.aggregate_daily import AGG_SPECS  # noqa: E402
+
 
 def convert_units(df: pd.DataFrame) -> pd.DataFrame:
+    # работает и для xr.Dataset (сеточный выход): `in` и [] у него такие же
     # t2m, d2m: K -> C
     for col in ["t2m", "d2m"]:
-        if col in df.columns:
+        if col in df:
             df[col] = df[col] - 273.15
 
     # tp: meters -> mm
-    if "tp" in df.columns:
+    if "tp" in df:
         df["tp"] = df["tp"] * 1000.0
 
     # wind speed from u10, v10
-    if "u10" in df.columns and "v10" in df.columns:
+    if "u10" in df and "v10" in df:
         df["wind_speed_10m"] = np.sqrt(df["u10"] ** 2 + df["v10"] ** 2)
 
     return df
@@ -45,52 +62,103 @@ def _extract_first_nc(zip_path: Path, td: Path) -> Path:
         return out_nc
 
 
-def region_mean_timeseries(path_str: str, variables: list[str]) -> pd.DataFrame:
+def _time_dim(ds: xr.Dataset) -> str:
+    for name in ("valid_time", "time"):
+        if name in ds.dims:
+            return name
+    raise RuntimeError(f"Не нашёл time/valid_time dims. Dims={list(ds.dims)}")
+
+
+def grid_daily(ds: xr.Dataset) -> pd.DataFrame:
+    """Суточные значения по каждой ячейке сетки: day, lat, lon + метрики с теми же именами, что в daily.
+
+    Единицы переводятся до суточной агрегации (скорость ветра считается по часам, как в hourly -> daily).
+    Ячейки, где все метрики пустые (море/вне маски суши), выкидываются.
+    """
+    t = _time_dim(ds)
+    hourly = convert_units(ds.copy())
+
+    # только пары (переменная, агрегат) из AGG_SPECS — не все агрегаты по всем переменным
+    parts = []
+    for var, v_fns in AGG_SPECS.items():
+        if var not in hourly:
+            continue
+        r = hourly[var].resample({t: "1D"})
+        for fn in v_fns:
+            # min_count=1: сумма по одним NaN (море) остаётся NaN, а не 0
+            reduced = getattr(r, fn)(skipna=True, **({"min_count": 1} if fn == "sum" else {}))
+            parts.append(reduced.rename(f"{var}_{fn}"))
+
+    df = xr.Dataset({p.name: p for p in parts}).to_dataframe().reset_index()
+    df = df.rename(columns={t: "day", "latitude": "lat", "longitude": "lon"})
+    metrics = [p.name for p in parts]
+    df = df.dropna(subset=metrics, how="all")
+    df["day"] = pd.to_datetime(df["day"]).dt.date
+    return df[["day", "lat", "lon", *metrics]].reset_index(drop=True)
+
+
+@contextmanager
+def open_raw(path_str: str, variables: list[str]):
+    """Открывает raw-файл месяца (.nc или ZIP с .nc) и отдаёт Dataset только с нужными переменными."""
     path = Path(path_str)
 
     with tempfile.TemporaryDirectory() as td0:
         td = Path(td0)
 
-        # если "month=01.nc" на самом деле ZIP — ок
-        if zipfile.is_zipfile(path):
-            nc_path = _extract_first_nc(path, td)
-        else:
-            nc_path = path
+        with stage("decode") as st:
+            st.bytes_read = file_size(path)
+            # если "month=01.nc" на самом деле ZIP — ок
+            if zipfile.is_zipfile(path):
+                nc_path = _extract_first_nc(path, td)
+            else:
+                nc_path = path
 
-        ds = xr.open_dataset(nc_path, engine=None)
+            ds = xr.open_dataset(nc_path, engine=None)
 
         try:
             vars_present = [v for v in variables if v in ds.data_vars]
             if not vars_present:
                 raise RuntimeError(f"Нет нужных переменных в файле: {path}. Есть: {list(ds.data_vars)}")
+            yield ds[vars_present]
+        finally:
+            ds.close()
 
-            ds = ds[vars_present]
 
-            # mean по lat/lon
-            if "latitude" in ds.dims and "longitude" in ds.dims:
-                agg = ds.mean(dim=["latitude", "longitude"], skipna=True)
-            else:
-                dims = [d for d in ds.dims if d.lower() in ("lat", "lon", "latitude", "longitude")]
-                if not dims:
-                    raise RuntimeError(f"Не нашёл lat/lon dims в {path}. Dims={list(ds.dims)}")
-                agg = ds.mean(dim=dims, skipna=True)
-
-            df = agg.to_dataframe().reset_index()
-
-            # время
-            if "valid_time" in df.columns:
-                df = df.rename(columns={"valid_time": "ts"})
-            elif "time" in df.columns:
-                df = df.rename(columns={"time": "ts"})
-            else:
-                raise RuntimeError(f"Не нашёл time/valid_time в {path}. Cols={list(df.columns)}")
+def region_mean(ds: xr.Dataset, path: str | Path = "") -> pd.DataFrame:
+    """Среднее по bbox региона по часам из уже открытого Dataset."""
+    vars_present = list(ds.data_vars)
+
+    with stage("reduce") as st:
+        # mean по lat/lon (xarray читает данные лениво — основное чтение тоже здесь)
+        if "latitude" in ds.dims and "longitude" in ds.dims:
+            agg = ds.mean(dim=["latitude", "longitude"], skipna=True)
+        else:
+            dims = [d for d in ds.dims if d.lower() in ("lat", "lon", "latitude", "longitude")]
+            if not dims:
+                raise RuntimeError(f"Не нашёл lat/lon dims в {path}. Dims={list(ds.dims)}")
+            agg = ds.mean(dim=dims, skipna=True)
+
+        df = agg.to_dataframe().reset_index()
+        st.rows = len(df)
+        st.extra["cells"] = int(ds[vars_present[0]].size)
+
+    # время
+    if "valid_time" in df.columns:
+        df = df.rename(columns={"valid_time": "ts"})
+    elif "time" in df.columns:
+        df = df.rename(columns={"time": "ts"})
+    else:
+        raise RuntimeError(f"Не нашёл time/valid_time в {path}. Cols={list(df.columns)}")
 
-            keep = ["ts"] + vars_present
-            df = df[keep].sort_values("ts").reset_index(drop=True)
+    keep = ["ts"] + vars_present
+    df = df[keep].sort_values("ts").reset_index(drop=True)
+    return convert_units(df)
 
-            return convert_units(df)
-        finally:
-            ds.close()
+
+def region_mean_timeseries(path_str: str, variables: list[str]) -> pd.DataFrame:
+    """Среднее по bbox региона по часам."""
+    with open_raw(path_str, variables) as ds:
+        return region_mean(ds, path_str)
 
 
 def process_one(
@@ -100,7 +168,13 @@ def process_one(
     raw_root: str,
     out_root: str,
     variables: list[str],
+    metrics: dict | None = None,
+    grid_root: str | None = None,
 ) -> str:
+    # на dask-воркере конфиг инструментации приходит параметром
+    if metrics:
+        configure(**metrics)
+
     raw_root_p = Path(raw_root)
     out_root_p = Path(out_root)
 
@@ -114,17 +188,42 @@ def process_one(
     else:
         return f"SKIP (no raw): {p1}"
 
-    df = region_mean_timeseries(str(inp), variables)
-    df.insert(0, "region", region)
-
-    out_dir = out_root_p / f"region={region}" / f"year={year}"
-    out_dir.mkdir(parents=True, exist_ok=True)
-    out_file = out_dir / f"month={month:02d}.parquet"
-    df.to_parquet(out_file, index=False)
+    with partition(region=region, year=year, month=month):
+        # сетка — из того же открытого файла, без второго decode
+        with open_raw(str(inp), variables) as ds:
+            df = region_mean(ds, inp)
+            if grid_root:
+                with stage("grid_reduce") as st:
+                    grid = grid_daily(ds)
+                    st.rows = len(grid)
+        if grid_root:
+            grid_dir = Path(grid_root) / f"region={region}" / f"year={year}"
+            grid_dir.mkdir(parents=True, exist_ok=True)
+            grid_file = grid_dir / f"month={month:02d}.parquet"
+            with stage("grid_write") as st:
+                grid.to_parquet(grid_file, index=False)
+                st.rows = len(grid)
+                st.bytes_written = file_size(grid_file)
+        df.insert(0, "region", region)
+
+        out_dir = out_root_p / f"region={region}" / f"year={year}"
+        out_dir.mkdir(parents=True, exist_ok=True)
+        out_file = out_dir / f"month={month:02d}.parquet"
+        with stage("parquet_write") as st:
+            df.to_parquet(out_file, index=False)
+            st.rows = len(df)
+            st.bytes_written = file_size(out_file)
 
     return f"OK: {out_file}"
 
 
+def process_one_collected(*args, **kwargs) -> tuple[str, list[dict]]:
+    """process_one для dask: вместе с результатом возвращает записи стадий — RECORDS воркера драйверу не видны."""
+    with collect() as records:
+        msg = process_one(*args, **kwargs)
+    return msg, records
+
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--year", type=int, required=True)
@@ -134,7 +233,11 @@ def main():
     ap.add_argument("--out-root", type=str, default="data/marts/hourly")
     ap.add_argument("--vars", type=str, default="t2m,d2m,tp,u10,v10,swvl1,swvl2")
     ap.add_argument("--dask", type=str, default="")
+    ap.add_argument("--grid-root", type=str, default="",
+                    help="куда писать суточные значения по ячейкам сетки (например data/marts/grid); пусто — не писать")
+    add_cli_args(ap)
     args = ap.parse_args()
+    metrics = configure_from_args(args)
 
     months = [int(x) for x in args.months.split(",") if x.strip()]
     variables = [v.strip() for v in args.vars.split(",") if v.strip()]
@@ -149,23 +252,30 @@ def main():
             for m in months:
                 futures.append(
                     client.submit(
-                        process_one,
+                        process_one_collected,
                         region,
                         args.year,
                         m,
                         args.raw_root,
                         args.out_root,
                         variables,
+                        metrics,
+                        args.grid_root or None,
                         pure=False,
                     )
                 )
         for fut in futures:
-            print(fut.result())
+            msg, records = fut.result()
+            RECORDS.extend(records)
+            print(msg)
         client.close()
     else:
         for region in regions:
             for m in months:
-                print(process_one(region, args.year, m, args.raw_root, args.out_root, variables))
+                print(process_one(region, args.year, m, args.raw_root, args.out_root, variables,
+                                  grid_root=args.grid_root or None))
+
+    publish_artifact()
 
 
 if __name__ == "__main__":
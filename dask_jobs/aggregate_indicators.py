@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.instrumentation import (  # noqa: E402
+    add_cli_args,
+    configure_from_args,
+    file_size,
+    partition,
+    publish_artifact,
+    stage,
+)
+
+
+DEFAULT_PARAMS = {
+    "gdd_base": 5.0,        # °C, база для сумм активных температур
+    "dry_day_mm": 1.0,      # день сухой, если tp_sum < порога
+    "frost_c": 0.0,         # заморозок, если t2m_min < порога
+    "season_start": "01-01",  # MM-DD, с какого дня копим сезонные суммы
+}
+
+# накопительные показатели: колонка-приращение -> колонка-сумма
+CUMULATIVE = {
+    "gdd": "gdd_cum",
+    "tp_sum": "tp_cum",
+    "frost_day": "frost_days_cum",
+    "water_balance": "water_balance_cum",
+}
+
+STATE_COLS = ["season", "gdd_cum", "tp_cum", "frost_days_cum", "water_balance_cum", "dry_spell_days", "dry_spell_max", "last_day"]
+
+
+def season_of(day: pd.Series, season_start: str) -> pd.Series:
+    # сезон = год, в котором он начался
+    mm, dd = (int(x) for x in season_start.split("-"))
+    before = (day.dt.month < mm) | ((day.dt.month == mm) & (day.dt.day < dd))
+    return (day.dt.year - before.astype(int)).astype(int)
+
+
+def hargreaves_pet(t_mean, t_min, t_max, lat_deg, doy) -> np.ndarray:
+    """Потенциальная эвапотранспирация по Hargreaves (FAO-56), мм/сутки."""
+    phi = np.deg2rad(lat_deg)
+    dr = 1 + 0.033 * np.cos(2 * np.pi * doy / 365)
+    delta = 0.409 * np.sin(2 * np.pi * doy / 365 - 1.39)
+    ws = np.arccos(np.clip(-np.tan(phi) * np.tan(delta), -1.0, 1.0))
+    ra = 24 * 60 / np.pi * 0.0820 * dr * (ws * np.sin(phi) * np.sin(delta) + np.cos(phi) * np.cos(delta) * np.sin(ws))
+    pet = 0.0023 * 0.408 * ra * (t_mean + 17.8) * np.sqrt(np.clip(t_max - t_min, 0, None))
+    return np.clip(pet, 0, None)
+
+
+def region_latitudes(regions_yaml: str) -> dict[str, float]:
+    cfg = yaml.safe_load(Path(regions_yaml).read_text(encoding="utf-8"))
+    # area: [north, west, south, east] -> центр bbox по широте
+    return {r: (v["area"][0] + v["area"][2]) / 2 for r, v in cfg.items() if v.get("area")}
+
+
+def compute_month(
+    daily: pd.DataFrame,
+    prev_state: dict[str, dict],
+    lat_by_region: dict[str, float],
+    params: dict,
+) -> tuple[pd.DataFrame, dict[str, dict]]:
+    """Индикаторы за месяц по всем регионам; prev_state — состояние на конец предыдущего месяца."""
+    df = daily.copy()
+    df["day"] = pd.to_datetime(df["day"])
+    df = df.sort_values(["region", "day"]).reset_index(drop=True)
+
+    region = df["region"]
+    season = season_of(df["day"], params["season_start"])
+
+    inc = pd.DataFrame(index=df.index)
+    inc["gdd"] = (df["t2m_mean"] - params["gdd_base"]).clip(lower=0)
+    inc["tp_sum"] = df["tp_sum"]
+    inc["frost_day"] = (df["t2m_min"] < params["frost_c"]).astype(int)
+
+    if "pev_mm_sum" in df.columns:
+        pet = df["pev_mm_sum"]
+    else:
+        lat = region.map(lat_by_region).astype(float)
+        pet = pd.Series(
+            hargreaves_pet(df["t2m_mean"], df["t2m_min"], df["t2m_max"], lat, df["day"].dt.dayofyear),
+            index=df.index,
+        )
+    inc["water_balance"] = df["tp_sum"] - pet
+
+    prev = pd.DataFrame.from_dict(prev_state, orient="index", columns=STATE_COLS) if prev_state else pd.DataFrame(columns=STATE_COLS)
+    # перенос состояния только внутри того же сезона
+    same_season = season == region.map(prev["season"])
+
+    out = pd.DataFrame({"region": region, "day": df["day"].dt.date, "season": season})
+    out["gdd"] = inc["gdd"]
+    out["pet_mm"] = pet
+    out["water_balance"] = inc["water_balance"]
+
+    keys = [region, season]
+    for src, dst in CUMULATIVE.items():
+        carry = region.map(prev[dst]).astype(float).where(same_season, 0.0).fillna(0.0)
+        out[dst] = inc[src].groupby(keys).cumsum() + carry
+    out["frost_days_cum"] = out["frost_days_cum"].astype(int)
+
+    # серия сухих дней: сбрасывается дождливым днём, через границу сезона не рвётся
+    dry = df["tp_sum"] < params["dry_day_mm"]
+    wet_run_id = (~dry).astype(int).groupby(region).cumsum()
+    carry_dry = region.map(prev["dry_spell_days"]).astype(float).fillna(0.0).where(wet_run_id == 0, 0.0)
+    out["dry_spell_days"] = (dry.astype(int).groupby([region, wet_run_id]).cumsum() + carry_dry).astype(int)
+
+    carry_max = region.map(prev["dry_spell_max"]).astype(float).where(same_season, 0.0).fillna(0.0)
+    out["dry_spell_max"] = np.maximum(out["dry_spell_days"].groupby(keys).cummax(), carry_max).astype(int)
+
+    new_state = dict(prev_state)
+    for r, last in out.groupby("region").tail(1).set_index("region").iterrows():
+        new_state[r] = {
+            "season": int(last["season"]),
+            **{c: float(last[c]) for c in CUMULATIVE.values()},
+            "dry_spell_days": int(last["dry_spell_days"]),
+            "dry_spell_max": int(last["dry_spell_max"]),
+            "last_day": str(last["day"]),
+        }
+
+    return out, new_state
+
+
+# -------------------- состояние на границе месяцев --------------------
+
+def prev_month(year: int, month: int) -> tuple[int, int]:
+    return (year - 1, 12) if month == 1 else (year, month - 1)
+
+
+def next_month(year: int, month: int) -> tuple[int, int]:
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def state_path(out_root: Path, year: int, month: int) -> Path:
+    return out_root / "_state" / f"year={year}" / f"month={month:02d}.json"
+
+
+def load_state(out_root: Path, year: int, month: int, params: dict) -> dict | None:
+    p = state_path(out_root, year, month)
+    if not p.exists():
+        return None
+    data = json.loads(p.read_text(encoding="utf-8"))
+    # состояние посчитано с другими параметрами — им пользоваться нельзя
+    if data.get("params") != params:
+        return None
+    return data["regions"]
+
+
+def save_state(out_root: Path, year: int, month: int, params: dict, regions: dict) -> Path:
+    p = state_path(out_root, year, month)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    p.write_text(json.dumps({"params": params, "regions": regions}, ensure_ascii=False, indent=2), encoding="utf-8")
+    return p
+
+
+def build_month(
+    daily_root: Path,
+    out_root: Path,
+    year: int,
+    month: int,
+    lat_by_region: dict[str, float],
+    params: dict | None = None,
+) -> Path | None:
+    """Индикаторы за месяц. Берёт состояние предыдущего месяца; если его нет — сначала досчитывает предыдущие."""
+    params = {**DEFAULT_PARAMS, **(params or {})}
+
+    daily_file = daily_root / f"year={year}" / f"month={month:02d}.parquet"
+    if not daily_file.exists():
+        return None
+
+    py, pm = prev_month(year, month)
+    prev_state = load_state(out_root, py, pm, params)
+    if prev_state is None:
+        # досчитываем только недостающие месяцы, пока есть daily
+        if build_month(daily_root, out_root, py, pm, lat_by_region, params) is not None:
+            prev_state = load_state(out_root, py, pm, params)
+        prev_state = prev_state or {}
+
+    with partition(year=year, month=month):
+        with stage("indicators") as st:
+            daily = pd.read_parquet(daily_file)
+            out, new_state = compute_month(daily, prev_state, lat_by_region, params)
+            st.bytes_read = file_size(daily_file)
+            st.rows = len(out)
+
+        out_dir = out_root / f"year={year}"
+        out_dir.mkdir(parents=True, exist_ok=True)
+        out_file = out_dir / f"month={month:02d}.parquet"
+        with stage("parquet_write") as st:
+            out.to_parquet(out_file, index=False)
+            st.rows = len(out)
+            st.bytes_written = file_size(out_file)
+
+    save_state(out_root, year, month, params, new_state)
+    return out_file
+
+
+def chain_months(out_root: Path, year: int, months: list[int]) -> list[tuple[int, int]]:
+    """Месяцы, которые нужно пересчитать вместе с months: сплошь от первого до последнего (пропуски
+    между ними тоже — их состояние зависит от пересчитанных) и дальше, пока есть уже посчитанные."""
+    months = sorted(months)
+    if not months:
+        return []
+    last = (year, months[-1])
+    out, (y, m) = [], (year, months[0])
+    while (y, m) <= last or state_path(out_root, y, m).exists():
+        out.append((y, m))
+        y, m = next_month(y, m)
+    return out
+
+
+def build_chain(
+    daily_root: Path,
+    out_root: Path,
+    year: int,
+    months: list[int],
+    lat_by_region: dict[str, float],
+    params: dict | None = None,
+) -> tuple[list[tuple[int, int, Path]], list[tuple[int, int, Path]]]:
+    """Считает months и обновляет всё, что от них зависит. Возвращает (посчитанные, обновлённые) как (year, month, path)."""
+    requested = {(year, m) for m in months}
+    built, refreshed = [], []
+    for y, m in chain_months(out_root, year, months):
+        p = build_month(daily_root, out_root, y, m, lat_by_region, params)
+        if (y, m) in requested:
+            if p is not None:
+                built.append((y, m, p))
+        elif p is None:
+            # без daily цепочка дальше не обновится — дальше состояние было бы пустым
+            break
+        else:
+            refreshed.append((y, m, p))
+    return built, refreshed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--year", type=int, required=True)
+    ap.add_argument("--months", type=str, default="1")
+    ap.add_argument("--daily-root", type=str, default="data/marts/daily")
+    ap.add_argument("--out-root", type=str, default="data/marts/indicators")
+    ap.add_argument("--regions-yaml", type=str, default="config/regions.yaml")
+    ap.add_argument("--gdd-base", type=float, default=DEFAULT_PARAMS["gdd_base"])
+    ap.add_argument("--dry-day-mm", type=float, default=DEFAULT_PARAMS["dry_day_mm"])
+    ap.add_argument("--frost-c", type=float, default=DEFAULT_PARAMS["frost_c"])
+    ap.add_argument("--season-start", type=str, default=DEFAULT_PARAMS["season_start"], help="MM-DD")
+    add_cli_args(ap)
+    args = ap.parse_args()
+    configure_from_args(args)
+
+    months = sorted(int(x) for x in args.months.split(",") if x.strip())
+    daily_root = Path(args.daily_root)
+    out_root = Path(args.out_root)
+    lat_by_region = region_latitudes(args.regions_yaml)
+    params = {
+        "gdd_base": args.gdd_base,
+        "dry_day_mm": args.dry_day_mm,
+        "frost_c": args.frost_c,
+        "season_start": args.season_start,
+    }
+
+    built, refreshed = build_chain(daily_root, out_root, args.year, months, lat_by_region, params)
+    done = {m for _, m, _ in built}
+    for m in months:
+        if m not in done:
+            print("SKIP month (no daily parquet):", m)
+    for _, _, p in built:
+        print("OK:", p)
+    for y, m, p in refreshed:
+        # состояние поменялось у уже посчитанных месяцев — их нужно перезалить в БД тоже
+        print(f"REFRESHED: {p} (load: --year {y} --months {m})")
+
+    publish_artifact()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+CREATE SCHEMA IF NOT EXISTS marts;
+
+-- сезонные агро-индикаторы (dask_jobs/aggregate_indicators.py)
+CREATE TABLE IF NOT EXISTS marts.era5_indicators_daily (
+  region TEXT NOT NULL,
+  day DATE NOT NULL,
+  season INTEGER NOT NULL,
+  gdd DOUBLE PRECISION,
+  pet_mm DOUBLE PRECISION,
+  water_balance DOUBLE PRECISION,
+  gdd_cum DOUBLE PRECISION,
+  tp_cum DOUBLE PRECISION,
+  frost_days_cum INTEGER,
+  water_balance_cum DOUBLE PRECISION,
+  dry_spell_days INTEGER,
+  dry_spell_max INTEGER,
+  PRIMARY KEY (region, day)
+);
@@ -0,0 +1,99 @@
+CREATE SCHEMA IF NOT EXISTS marts;
+
+-- rollup'ы поверх витрин (common/rollups.py); пересчитываются loader'ами по затронутым корзинам
+
+CREATE TABLE IF NOT EXISTS marts.era5_daily_week (
+  region TEXT NOT NULL,
+  bucket_start DATE NOT NULL,
+  bucket_end DATE NOT NULL,
+  n_rows INTEGER NOT NULL,
+  t2m_mean DOUBLE PRECISION,
+  t2m_min DOUBLE PRECISION,
+  t2m_max DOUBLE PRECISION,
+  d2m_mean DOUBLE PRECISION,
+  tp_sum DOUBLE PRECISION,
+  swvl1_mean DOUBLE PRECISION,
+  swvl2_mean DOUBLE PRECISION,
+  wind_speed_10m_mean DOUBLE PRECISION,
+  PRIMARY KEY (region, bucket_start)
+);
+
+CREATE TABLE IF NOT EXISTS marts.era5_daily_month (
+  region TEXT NOT NULL,
+  bucket_start DATE NOT NULL,
+  bucket_end DATE NOT NULL,
+  n_rows INTEGER NOT NULL,
+  t2m_mean DOUBLE PRECISION,
+  t2m_min DOUBLE PRECISION,
+  t2m_max DOUBLE PRECISION,
+  d2m_mean DOUBLE PRECISION,
+  tp_sum DOUBLE PRECISION,
+  swvl1_mean DOUBLE PRECISION,
+  swvl2_mean DOUBLE PRECISION,
+  wind_speed_10m_mean DOUBLE PRECISION,
+  PRIMARY KEY (region, bucket_start)
+);
+
+CREATE TABLE IF NOT EXISTS marts.era5_daily_season (
+  region TEXT NOT NULL,
+  bucket_start DATE NOT NULL,
+  bucket_end DATE NOT NULL,
+  n_rows INTEGER NOT NULL,
+  t2m_mean DOUBLE PRECISION,
+  t2m_min DOUBLE PRECISION,
+  t2m_max DOUBLE PRECISION,
+  d2m_mean DOUBLE PRECISION,
+  tp_sum DOUBLE PRECISION,
+  swvl1_mean DOUBLE PRECISION,
+  swvl2_mean DOUBLE PRECISION,
+  wind_speed_10m_mean DOUBLE PRECISION,
+  PRIMARY KEY (region, bucket_start)
+);
+
+CREATE TABLE IF NOT EXISTS marts.era5_hourly_day (
+  region TEXT NOT NULL,
+  bucket_start DATE NOT NULL,
+  bucket_end DATE NOT NULL,
+  n_rows INTEGER NOT NULL,
+  t2m DOUBLE PRECISION,
+  d2m DOUBLE PRECISION,
+  tp DOUBLE PRECISION,
+  u10 DOUBLE PRECISION,
+  v10 DOUBLE PRECISION,
+  swvl1 DOUBLE PRECISION,
+  swvl2 DOUBLE PRECISION,
+  wind_speed_10m DOUBLE PRECISION,
+  PRIMARY KEY (region, bucket_start)
+);
+
+CREATE TABLE IF NOT EXISTS marts.era5_hourly_week (
+  region TEXT NOT NULL,
+  bucket_start DATE NOT NULL,
+  bucket_end DATE NOT NULL,
+  n_rows INTEGER NOT NULL,
+  t2m DOUBLE PRECISION,
+  d2m DOUBLE PRECISION,
+  tp DOUBLE PRECISION,
+  u10 DOUBLE PRECISION,
+  v10 DOUBLE PRECISION,
+  swvl1 DOUBLE PRECISION,
+  swvl2 DOUBLE PRECISION,
+  wind_speed_10m DOUBLE PRECISION,
+  PRIMARY KEY (region, bucket_start)
+);
+
+CREATE TABLE IF NOT EXISTS marts.era5_hourly_month (
+  region TEXT NOT NULL,
+  bucket_start DATE NOT NULL,
+  bucket_end DATE NOT NULL,
+  n_rows INTEGER NOT NULL,
+  t2m DOUBLE PRECISION,
+  d2m DOUBLE PRECISION,
+  tp DOUBLE PRECISION,
+  u10 DOUBLE PRECISION,
+  v10 DOUBLE PRECISION,
+  swvl1 DOUBLE PRECISION,
+  swvl2 DOUBLE PRECISION,
+  wind_speed_10m DOUBLE PRECISION,
+  PRIMARY KEY (region, bucket_start)
+);
@@ -0,0 +1,30 @@
+CREATE SCHEMA IF NOT EXISTS marts;
+
+-- день года без 29 февраля (29.02 -> 59, в високосный год дальше сдвиг на 1);
+-- та же формула в dask_jobs/aggregate_climatology.py: doy365()
+CREATE OR REPLACE FUNCTION marts.doy365(d DATE) RETURNS INTEGER
+LANGUAGE SQL IMMUTABLE PARALLEL SAFE AS $$
+  SELECT extract(doy FROM d)::int
+         - CASE WHEN extract(doy FROM d) >= 60
+                 AND (extract(year FROM d)::int % 4 = 0
+                      AND (extract(year FROM d)::int % 100 <> 0 OR extract(year FROM d)::int % 400 = 0))
+                THEN 1 ELSE 0 END
+$$;
+
+-- климатическая норма: регион × метрика × день года (dask_jobs/aggregate_climatology.py)
+CREATE TABLE IF NOT EXISTS marts.era5_climatology (
+  region TEXT NOT NULL,
+  metric TEXT NOT NULL,
+  doy INTEGER NOT NULL,
+  n INTEGER,
+  n_years INTEGER,
+  mean DOUBLE PRECISION,
+  std DOUBLE PRECISION,
+  p10 DOUBLE PRECISION,
+  p50 DOUBLE PRECISION,
+  p90 DOUBLE PRECISION,
+  ref_start INTEGER NOT NULL,
+  ref_end INTEGER NOT NULL,
+  "window" INTEGER NOT NULL,
+  PRIMARY KEY (region, metric, doy)
+);
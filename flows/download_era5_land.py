@@ -3,14 +3,33 @@ from __future__ import annotations
 
 import argparse
 import calendar
+import hashlib
 import json
 import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
 from pathlib import Path
 
 import cdsapi
+import pandas as pd
+import requests
+import xarray as xr
 import yaml
 from prefect import flow, task, get_run_logger
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.instrumentation import (  # noqa: E402
+    add_cli_args,
+    configure_from_args,
+    file_size,
+    partition,
+    publish_artifact,
+    stage,
+)
+
 TIMES = [f"{h:02d}:00" for h in range(24)]
 
 # можно передавать короткие коды, а в CDS уйдут корректные имена переменных
@@ -30,6 +49,12 @@ VAR_MAP = {
     "lai_lv": "leaf_area_index_low_vegetation",
 }
 
+# обратное соответствие: длинное имя CDS -> короткое имя переменной в NetCDF
+SHORT_NAMES = {v: k for k, v in VAR_MAP.items()}
+
+QUARANTINE_DIR = "_quarantine"
+CHUNK_SIZE = 1 << 20
+
 
 def _project_root() -> Path:
     # flows/ лежит в корне проекта
@@ -57,6 +82,190 @@ def _normalize_variables(vars_in: list[str]) -> list[str]:
     return out
 
 
+def _request_hash(req: dict) -> str:
+    return hashlib.sha256(json.dumps(req, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _read_manifest(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except ValueError:
+        # битый манифест не должен блокировать загрузку — просто начинаем заново
+        return {}
+
+
+def _write_manifest(path: Path, manifest: dict) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _expected_times(req: dict) -> pd.DatetimeIndex:
+    year, month = int(req["year"]), int(req["month"])
+    stamps = [
+        pd.Timestamp(year=year, month=month, day=int(d), hour=int(t[:2]))
+        for d in req["day"]
+        for t in req["time"]
+    ]
+    return pd.DatetimeIndex(sorted(stamps))
+
+
+def _open_nc_parts(path: Path, td: Path) -> list[Path]:
+    # CDS может отдать ZIP (в т.ч. под именем .nc) с несколькими .nc внутри (instant/accum)
+    if not zipfile.is_zipfile(path):
+        return [path]
+    with zipfile.ZipFile(path, "r") as zf:
+        bad = zf.testzip()
+        if bad is not None:
+            raise RuntimeError(f"CRC mismatch in {bad}")
+        names = [n for n in zf.namelist() if n.lower().endswith(".nc")]
+        if not names:
+            raise RuntimeError("ZIP без .nc внутри")
+        return [Path(zf.extract(n, td)) for n in names]
+
+
+def _var_aliases(name: str, da: xr.DataArray) -> set[str]:
+    # под какими именами переменная может фигурировать в запросе: короткое имя в NetCDF,
+    # GRIB-атрибуты и long_name в виде имени CDS ("Surface pressure" -> "surface_pressure")
+    out = {name}
+    for attr in ("GRIB_shortName", "GRIB_cfVarName", "long_name"):
+        v = da.attrs.get(attr)
+        if isinstance(v, str) and v:
+            out.add(v)
+            out.add(v.strip().lower().replace(" ", "_"))
+    return out
+
+
+def validate_raw(path: Path, req: dict, expected_size: int | None = None) -> dict:
+    """Проверяет, что скачанный файл читается и покрывает запрос по времени и переменным.
+
+    Переменные из VAR_MAP обязаны быть в файле под коротким именем. Остальные (длинные имена CDS, которых
+    нет в VAR_MAP) ищутся по атрибутам; если не нашлись — только предупреждение в result["warnings"].
+    """
+    st = path.stat()
+    result = {
+        "ok": False,
+        "checked_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "format": "zip" if zipfile.is_zipfile(path) else "netcdf",
+        "errors": [],
+        "warnings": [],
+    }
+    errors = result["errors"]
+
+    if st.st_size == 0:
+        errors.append("empty file")
+        return result
+    if expected_size and st.st_size != expected_size:
+        errors.append(f"size {st.st_size} != expected {expected_size}")
+        return result
+
+    expected_vars = {SHORT_NAMES[v] for v in req["variable"] if v in SHORT_NAMES}
+    unmapped_vars = {v for v in req["variable"] if v not in SHORT_NAMES}
+    expected_ts = _expected_times(req)
+
+    found_vars: set[str] = set()
+    found_aliases: set[str] = set()
+    found_ts = pd.DatetimeIndex([])
+    try:
+        with tempfile.TemporaryDirectory() as td0:
+            for nc in _open_nc_parts(path, Path(td0)):
+                with xr.open_dataset(nc) as ds:
+                    found_vars |= set(ds.data_vars)
+                    for name, da in ds.data_vars.items():
+                        found_aliases |= _var_aliases(name, da)
+                    tname = "valid_time" if "valid_time" in ds.coords else "time"
+                    if tname not in ds.coords:
+                        errors.append(f"{nc.name}: no time/valid_time coordinate")
+                        continue
+                    found_ts = found_ts.union(pd.DatetimeIndex(ds[tname].values))
+    except Exception as e:  # noqa: BLE001 — любой сбой чтения = файл битый
+        errors.append(f"unreadable: {type(e).__name__}: {e}")
+        return result
+
+    missing_vars = sorted(expected_vars - found_vars)
+    missing_ts = expected_ts.difference(found_ts)
+
+    result["time_steps"] = int(len(found_ts))
+    result["expected_time_steps"] = int(len(expected_ts))
+    result["variables"] = sorted(found_vars)
+
+    if missing_vars:
+        errors.append(f"missing variables: {missing_vars}")
+    unmatched = sorted(unmapped_vars - found_aliases)
+    if unmatched:
+        result["warnings"].append(f"cannot verify variables (no short name in VAR_MAP): {unmatched}")
+    if len(missing_ts):
+        errors.append(f"missing {len(missing_ts)} time steps, first: {missing_ts[0].isoformat()}")
+
+    result["ok"] = not errors
+    return result
+
+
+def _quarantine(path: Path, manifest: dict, validation: dict) -> Path:
+    qdir = path.parent / QUARANTINE_DIR
+    qdir.mkdir(parents=True, exist_ok=True)
+    dst = qdir / f"{path.name}.{time.strftime('%Y%m%dT%H%M%S')}"
+    shutil.move(str(path), dst)
+    manifest.setdefault("quarantined", []).append(
+        {"path": str(dst), "at": validation["checked_at"], "errors": validation["errors"]}
+    )
+    return dst
+
+
+def _http_download(url: str, tmp: Path, logger) -> None:
+    # докачиваем .part через Range, если сервер это поддерживает
+    pos = tmp.stat().st_size if tmp.exists() else 0
+    headers = {"Range": f"bytes={pos}-"} if pos else {}
+
+    with requests.get(url, stream=True, headers=headers, timeout=60) as r:
+        if pos and r.status_code == 416:
+            # всё уже скачано
+            return
+        r.raise_for_status()
+        if pos and r.status_code != 206:
+            logger.info(f"server ignored Range, restarting {tmp.name}")
+            pos = 0
+        elif pos:
+            logger.info(f"RESUME {tmp.name} from {pos} bytes")
+
+        with tmp.open("ab" if pos else "wb") as f:
+            for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+
+
+def _fetch(dataset: str, req: dict, tmp: Path, manifest: dict, manifest_path: Path, logger) -> None:
+    location = manifest.get("location")
+
+    if tmp.exists() and location:
+        try:
+            _http_download(location, tmp, logger)
+            return
+        except requests.RequestException as e:
+            # ссылка могла протухнуть — заказываем заново
+            logger.warning(f"resume failed ({e}), requesting again")
+            tmp.unlink(missing_ok=True)
+
+    if tmp.exists():
+        tmp.unlink()
+
+    c = cdsapi.Client()
+    result = c.retrieve(dataset, req)
+
+    location = getattr(result, "location", None)
+    manifest["location"] = location
+    manifest["content_length"] = getattr(result, "content_length", None)
+    _write_manifest(manifest_path, manifest)
+
+    if location:
+        _http_download(location, tmp, logger)
+    else:
+        result.download(str(tmp))
+
+
 @task(retries=2, retry_delay_seconds=30)
 def download_month(
     *,
@@ -76,12 +285,9 @@ def download_month(
 
     target = out_dir / f"month={month:02d}.nc"
     meta = out_dir / f"month={month:02d}.request.json"
+    manifest_path = out_dir / f"month={month:02d}.manifest.json"
     tmp = out_dir / f"month={month:02d}.nc.part"
 
-    if target.exists():
-        logger.info(f"SKIP {target}")
-        return str(target)
-
     req = {
         "product_type": "reanalysis",
         "format": "netcdf",
@@ -92,15 +298,78 @@ def download_month(
         "time": TIMES,
         "area": area,  # [north, west, south, east]
     }
+    with partition(region=region, year=year, month=month):
+        return _download_month(
+            dataset=dataset, req=req, target=target, meta=meta, manifest_path=manifest_path, tmp=tmp, logger=logger
+        )
+
+
+def _download_month(*, dataset: str, req: dict, target: Path, meta: Path, manifest_path: Path, tmp: Path, logger) -> str:
+    req_hash = _request_hash(req)
+    manifest = _read_manifest(manifest_path)
+
+    if target.exists():
+        cached = manifest.get("validation") or {}
+        stat = target.stat()
+        # быстрый путь — только для того же запроса: файл от --limit-days 7 не годится для полного месяца
+        if (
+            manifest.get("request_sha256") == req_hash
+            and cached.get("ok")
+            and cached.get("size") == stat.st_size
+            and cached.get("mtime_ns") == stat.st_mtime_ns
+        ):
+            logger.info(f"SKIP {target}")
+            return str(target)
+
+        with stage("validate") as st:
+            validation = validate_raw(target, req)
+            st.bytes_read = validation["size"]
+            st.extra["valid"] = validation["ok"]
+        for w in validation["warnings"]:
+            logger.warning(f"{target}: {w}")
+        if validation["ok"]:
+            manifest.update(file=target.name, request_sha256=req_hash, validation=validation)
+            _write_manifest(manifest_path, manifest)
+            logger.info(f"SKIP {target} (validated)")
+            return str(target)
+
+        dst = _quarantine(target, manifest, validation)
+        logger.warning(f"QUARANTINE {target} -> {dst}: {validation['errors']}")
+
+    if manifest.get("request_sha256") != req_hash:
+        # .part от другого запроса докачивать нельзя
+        tmp.unlink(missing_ok=True)
+        manifest = {"quarantined": manifest.get("quarantined", [])}
+    manifest["request_sha256"] = req_hash
+    manifest.pop("validation", None)
+
     meta.write_text(json.dumps(req, ensure_ascii=False, indent=2), encoding="utf-8")
 
-    if tmp.exists():
-        tmp.unlink()
+    logger.info(f"DOWNLOADING {target}")
+    with stage("download") as st:
+        resumed_from = file_size(tmp) or 0
+        _fetch(dataset, req, tmp, manifest, manifest_path, logger)
+        st.bytes_written = file_size(tmp)
+        st.extra["resumed_from_bytes"] = resumed_from
+
+    with stage("validate") as st:
+        validation = validate_raw(tmp, req, expected_size=manifest.get("content_length"))
+        st.bytes_read = validation["size"]
+        st.extra["valid"] = validation["ok"]
+    for w in validation["warnings"]:
+        logger.warning(f"{target}: {w}")
+    if not validation["ok"]:
+        dst = _quarantine(tmp, manifest, validation)
+        manifest.pop("location", None)
+        manifest["validation"] = validation
+        _write_manifest(manifest_path, manifest)
+        # retries у task'а перекачают файл заново
+        raise RuntimeError(f"Corrupt download {target} (moved to {dst}): {validation['errors']}")
 
-    logger.info(f"DOWNLOADING region={region} year={year} month={month:02d}")
-    c = cdsapi.Client()
-    c.retrieve(dataset, req, str(tmp))
     os.replace(tmp, target)
+    validation.update(size=target.stat().st_size, mtime_ns=target.stat().st_mtime_ns)
+    manifest.update(file=target.name, validation=validation)
+    _write_manifest(manifest_path, manifest)
 
     logger.info(f"OK {target}")
     return str(target)
@@ -158,6 +427,7 @@ def download_era5_land(
                 )
             )
 
+    publish_artifact(key="etl-stages-download")
     return outputs
 
 
@@ -171,7 +441,9 @@ def main():
     ap.add_argument("--regions-yaml", type=str, default="config/regions.yaml")
     ap.add_argument("--out-root", type=str, default="data/raw/era5-land")
     ap.add_argument("--dataset", type=str, default="reanalysis-era5-land")
+    add_cli_args(ap)
     args = ap.parse_args()
+    configure_from_args(args)
 
     months = [int(x) for x in args.months.split(",") if x.strip()]
     regions = [x.strip() for x in args.regions.split(",") if x.strip()] or None
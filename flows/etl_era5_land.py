@@ -0,0 +1,369 @@
+# flows/etl_era5_land.py
+#
+# Единый flow extract -> transform -> daily -> indicators -> load.
+# Граф строится по region × month: hourly каждой партиции грузится сразу после её transform,
+# daily месяца строится, как только готовы все регионы этого месяца, — не дожидаясь остальных месяцев.
+from __future__ import annotations
+
+import argparse
+import hashlib
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+import yaml
+from prefect import flow, task, get_run_logger
+from prefect.futures import wait
+from prefect.task_runners import ThreadPoolTaskRunner
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common import instrumentation  # noqa: E402
+from dask_jobs import aggregate_indicators  # noqa: E402
+from dask_jobs.aggregate_daily import build_month  # noqa: E402
+from dask_jobs.aggregate_hourly import process_one, process_one_collected  # noqa: E402
+from flows import load_daily_parquet_to_postgres as daily_loader  # noqa: E402
+from flows import load_hourly_parquet_to_postgres as hourly_loader  # noqa: E402
+from flows.download_era5_land import _normalize_variables, _resolve, download_month  # noqa: E402
+
+DEFAULT_VARS = ["t2m", "d2m", "tp", "u10", "v10", "swvl1", "swvl2"]
+HASH_CHUNK = 1 << 20
+
+
+def _file_digest(paths: list[Path]) -> str:
+    h = hashlib.sha256()
+    for p in sorted(paths):
+        h.update(p.name.encode("utf-8"))
+        with p.open("rb") as f:
+            while chunk := f.read(HASH_CHUNK):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def _raw_file(raw_root: str, region: str, year: int, month: int) -> Path | None:
+    # та же логика выбора, что в process_one: .nc важнее .zip
+    base = Path(raw_root) / f"region={region}" / f"year={year}"
+    for ext in ("nc", "zip"):
+        p = base / f"month={month:02d}.{ext}"
+        if p.exists():
+            return p
+    return None
+
+
+def _hourly_file(hourly_root: str, region: str, year: int, month: int) -> Path:
+    return Path(hourly_root) / f"region={region}" / f"year={year}" / f"month={month:02d}.parquet"
+
+
+def _daily_file(daily_root: str, year: int, month: int) -> Path:
+    return Path(daily_root) / f"year={year}" / f"month={month:02d}.parquet"
+
+
+# ключи кэша: хэш входных файлов + параметры, влияющие на результат.
+# None = не кэшировать (входа нет — кэшировать нечего)
+
+def _transform_key(context, p: dict) -> str | None:
+    raw = _raw_file(p["raw_root"], p["region"], p["year"], p["month"])
+    if raw is None:
+        return None
+    return f"transform-{_file_digest([raw])}-{','.join(p['variables'])}-{p['hourly_root']}"
+
+
+def _daily_key(context, p: dict) -> str | None:
+    files = sorted(Path(p["hourly_root"]).glob(f"region=*/year={p['year']}/month={p['month']:02d}.parquet"))
+    if not files:
+        return None
+    return f"daily-{_file_digest(files)}-{p['daily_root']}"
+
+
+def _indicators_key(context, p: dict) -> str | None:
+    daily = _daily_file(p["daily_root"], p["year"], p["month"])
+    if not daily.exists():
+        return None
+    y, m = aggregate_indicators.prev_month(p["year"], p["month"])
+    prev_state = aggregate_indicators.state_path(Path(p["indicators_root"]), y, m)
+    inputs = [daily] + ([prev_state] if prev_state.exists() else [])
+    return f"indicators-{_file_digest(inputs)}-{p['indicators_root']}"
+
+
+@lru_cache(maxsize=None)
+def _dask_client(address: str):
+    from dask.distributed import Client
+
+    return Client(address)
+
+
+@task(cache_key_fn=_transform_key, persist_result=True, retries=1)
+def transform_month(
+    *,
+    region: str,
+    year: int,
+    month: int,
+    raw_root: str,
+    hourly_root: str,
+    variables: list[str],
+    dask_address: str = "",
+    upstream: str | None = None,
+) -> str | None:
+    # upstream — только зависимость от download_month в графе
+    logger = get_run_logger()
+
+    if dask_address:
+        fut = _dask_client(dask_address).submit(
+            process_one_collected, region, year, month, raw_root, hourly_root, variables,
+            instrumentation.configure(), pure=False,
+        )
+        msg, records = fut.result()
+        instrumentation.RECORDS.extend(records)
+    else:
+        msg = process_one(region, year, month, raw_root, hourly_root, variables)
+
+    logger.info(msg)
+    out = _hourly_file(hourly_root, region, year, month)
+    return str(out) if out.exists() and not msg.startswith("SKIP") else None
+
+
+@task(cache_key_fn=_daily_key, persist_result=True)
+def build_daily(
+    *,
+    year: int,
+    month: int,
+    hourly_root: str,
+    daily_root: str,
+    upstream: list[str | None] | None = None,
+) -> str | None:
+    # upstream — hourly этого месяца по всем регионам запуска
+    out = build_month(Path(hourly_root), Path(daily_root), year, month)
+    if out is None:
+        get_run_logger().info(f"SKIP daily {year}-{month:02d} (no hourly parquet)")
+        return None
+    get_run_logger().info(f"OK {out}")
+    return str(out)
+
+
+@task(cache_key_fn=_indicators_key, persist_result=True)
+def build_indicators(
+    *,
+    year: int,
+    month: int,
+    daily_root: str,
+    indicators_root: str,
+    regions_yaml: str,
+    upstream: list[str | None] | None = None,
+) -> str | None:
+    # upstream — daily этого месяца и индикаторы предыдущего (его состояние — вход этого месяца)
+    out = aggregate_indicators.build_month(
+        Path(daily_root),
+        Path(indicators_root),
+        year,
+        month,
+        aggregate_indicators.region_latitudes(regions_yaml),
+    )
+    if out is None:
+        get_run_logger().info(f"SKIP indicators {year}-{month:02d} (no daily parquet)")
+        return None
+    get_run_logger().info(f"OK {out}")
+    return str(out)
+
+
+# загрузку не кэшируем: ключ по файлу не знает, в какую БД грузили (другой PGHOST/пересозданный том),
+# а upsert и так идемпотентен — повторная загрузка того же файла ничего не меняет
+@task(retries=2, retry_delay_seconds=10)
+def load_hourly(*, path: str | None, table: str = "marts.era5_hourly") -> int:
+    if not path:
+        return 0
+    conn = hourly_loader.connect()
+    try:
+        return hourly_loader.load_file(conn, Path(path), table=table)
+    finally:
+        conn.close()
+
+
+@task(retries=2, retry_delay_seconds=10)
+def load_daily(*, path: str | None, table: str = "marts.era5_daily") -> int:
+    if not path:
+        return 0
+    conn = daily_loader.connect()
+    try:
+        return daily_loader.load_file(conn, Path(path), table=table)
+    finally:
+        conn.close()
+
+
+@flow(name="etl-era5-land", task_runner=ThreadPoolTaskRunner(max_workers=4))
+def etl_era5_land(
+    *,
+    year: int,
+    months: list[int] | None = None,
+    variables: list[str] | None = None,
+    limit_days: int | None = 7,
+    only_regions: list[str] | None = None,
+    regions_yaml: str = "config/regions.yaml",
+    raw_root: str = "data/raw/era5-land",
+    hourly_root: str = "data/marts/hourly",
+    daily_root: str = "data/marts/daily",
+    indicators_root: str = "data/marts/indicators",
+    dataset: str = "reanalysis-era5-land",
+    download: bool = True,
+    load: bool = True,
+    dask_address: str = "",
+    refresh_cache: bool = False,
+    hourly_table: str = "marts.era5_hourly",
+    daily_table: str = "marts.era5_daily",
+    indicators_table: str = "marts.era5_indicators_daily",
+) -> dict:
+    logger = get_run_logger()
+
+    months = months or [1]
+    variables = variables or DEFAULT_VARS
+    # все пути абсолютные: задачи (и dask-воркеры) не зависят от cwd
+    raw_root_abs = str(_resolve(raw_root))
+    hourly_root_abs = str(_resolve(hourly_root))
+    daily_root_abs = str(_resolve(daily_root))
+    indicators_root_abs = str(_resolve(indicators_root))
+
+    cfg = yaml.safe_load(_resolve(regions_yaml).read_text(encoding="utf-8"))
+    regions = []
+    for r in only_regions or list(cfg.keys()):
+        area = cfg.get(r, {}).get("area")
+        if not area or area == [0.0, 0.0, 0.0, 0.0]:
+            logger.warning(f"Region '{r}' not found or has empty area, skipping")
+            continue
+        regions.append(r)
+
+    futures = []
+    hourly_loads, daily_loads, indicator_loads = [], [], []
+    dailies = {}
+    for m in sorted(months):
+        month_hourly = []
+        for r in regions:
+            raw = None
+            if download:
+                raw = download_month.submit(
+                    dataset=dataset,
+                    region=r,
+                    area=cfg[r]["area"],
+                    year=year,
+                    month=m,
+                    variables=_normalize_variables(variables),
+                    out_root=raw_root_abs,
+                    limit_days=limit_days,
+                )
+                futures.append(raw)
+
+            hourly_out = _hourly_file(hourly_root_abs, r, year, m)
+            hourly = transform_month.with_options(refresh_cache=refresh_cache or not hourly_out.exists()).submit(
+                region=r,
+                year=year,
+                month=m,
+                raw_root=raw_root_abs,
+                hourly_root=hourly_root_abs,
+                variables=variables,
+                dask_address=dask_address,
+                upstream=raw,
+            )
+            futures.append(hourly)
+            month_hourly.append(hourly)
+
+            if load:
+                hourly_loads.append(
+                    load_hourly.submit(path=hourly, table=hourly_table)
+                )
+
+        daily_out = _daily_file(daily_root_abs, year, m)
+        daily = build_daily.with_options(refresh_cache=refresh_cache or not daily_out.exists()).submit(
+            year=year,
+            month=m,
+            hourly_root=hourly_root_abs,
+            daily_root=daily_root_abs,
+            upstream=month_hourly,
+        )
+        futures.append(daily)
+        dailies[(year, m)] = daily
+        if load:
+            daily_loads.append(load_daily.submit(path=daily, table=daily_table))
+
+    # индикаторы идут цепочкой по месяцам: состояние месяца — вход следующего. Цепочка сплошная
+    # (с пропусками между months) и продолжается на уже посчитанные месяцы после последнего: ключ кэша
+    # включает состояние предыдущего месяца, так что пересчёт месяца инвалидирует все следующие,
+    # а не затронутые берутся из кэша. Загружаются все месяцы цепочки — upsert идемпотентен.
+    prev_indicators = None
+    for y, m in aggregate_indicators.chain_months(Path(indicators_root_abs), year, months):
+        indicators_out = _daily_file(indicators_root_abs, y, m)
+        indicators = build_indicators.with_options(
+            refresh_cache=refresh_cache or not indicators_out.exists()
+        ).submit(
+            year=y,
+            month=m,
+            daily_root=daily_root_abs,
+            indicators_root=indicators_root_abs,
+            regions_yaml=str(_resolve(regions_yaml)),
+            upstream=[dailies.get((y, m)), prev_indicators],
+        )
+        futures.append(indicators)
+        prev_indicators = indicators
+        if load:
+            indicator_loads.append(
+                load_daily.submit(path=indicators, table=indicators_table)
+            )
+
+    futures += hourly_loads + daily_loads + indicator_loads
+    wait(futures)
+
+    instrumentation.publish_artifact(key="etl-stages-etl-era5-land")
+
+    # result() поднимет исключение первой упавшей задачи — flow станет Failed
+    return {
+        "hourly_rows": sum(f.result() for f in hourly_loads),
+        "daily_rows": sum(f.result() for f in daily_loads),
+        "indicator_rows": sum(f.result() for f in indicator_loads),
+        "tasks": len(futures),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--year", type=int, required=True)
+    ap.add_argument("--months", type=str, default="1", help="например: 1,2,3")
+    ap.add_argument("--limit-days", type=int, default=7, help="первые N дней месяца (0 = весь месяц)")
+    ap.add_argument("--regions", type=str, default="", help="пусто = все из yaml")
+    ap.add_argument("--vars", type=str, default="", help="например: t2m,d2m,tp,u10,v10,swvl1,swvl2")
+    ap.add_argument("--regions-yaml", type=str, default="config/regions.yaml")
+    ap.add_argument("--raw-root", type=str, default="data/raw/era5-land")
+    ap.add_argument("--hourly-root", type=str, default="data/marts/hourly")
+    ap.add_argument("--daily-root", type=str, default="data/marts/daily")
+    ap.add_argument("--indicators-root", type=str, default="data/marts/indicators")
+    ap.add_argument("--dataset", type=str, default="reanalysis-era5-land")
+    ap.add_argument("--no-download", action="store_true", help="не качать, работать с тем, что уже в raw")
+    ap.add_argument("--no-load", action="store_true", help="без загрузки в Postgres")
+    ap.add_argument("--dask", type=str, default="", help="tcp://dask-scheduler:8786 — transform на кластере")
+    ap.add_argument("--workers", type=int, default=4, help="сколько задач flow выполнять одновременно")
+    ap.add_argument("--refresh-cache", action="store_true", help="игнорировать кэш задач")
+    instrumentation.add_cli_args(ap)
+    args = ap.parse_args()
+    instrumentation.configure_from_args(args)
+
+    months = [int(x) for x in args.months.split(",") if x.strip()]
+    regions = [x.strip() for x in args.regions.split(",") if x.strip()] or None
+    variables = [x.strip() for x in args.vars.split(",") if x.strip()] or None
+
+    result = etl_era5_land.with_options(task_runner=ThreadPoolTaskRunner(max_workers=args.workers))(
+        year=args.year,
+        months=months,
+        variables=variables,
+        limit_days=args.limit_days or None,
+        only_regions=regions,
+        regions_yaml=args.regions_yaml,
+        raw_root=args.raw_root,
+        hourly_root=args.hourly_root,
+        daily_root=args.daily_root,
+        indicators_root=args.indicators_root,
+        dataset=args.dataset,
+        download=not args.no_download,
+        load=not args.no_load,
+        dask_address=args.dask.strip(),
+        refresh_cache=args.refresh_cache,
+    )
+    print(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+import psycopg2
+from psycopg2.extras import execute_values
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.instrumentation import (  # noqa: E402
+    add_cli_args,
+    configure_from_args,
+    file_size,
+    publish_artifact,
+    stage,
+)
+
+
+def connect():
+    host = os.getenv("PGHOST", "127.0.0.1")
+    port = int(os.getenv("PGPORT", "5432"))
+    db = os.getenv("PGDATABASE", "agri")
+    user = os.getenv("PGUSER", "agri")
+    pwd = os.getenv("PGPASSWORD", "agri")
+    return psycopg2.connect(host=host, port=port, dbname=db, user=user, password=pwd)
+
+
+def replace_df(conn, df: pd.DataFrame, table: str = "marts.era5_climatology"):
+    # норма пересчитывается целиком по регионам из df — старые строки этих регионов заменяем
+    # одной транзакцией, чтобы дашборд не видел полупустую таблицу
+    cols = list(df.columns)
+    if not {"region", "metric", "doy"} <= set(cols):
+        raise ValueError("Expected columns: region, metric, doy")
+
+    col_sql = ",".join(f'"{c}"' for c in cols)
+    values = [tuple(x) for x in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)]
+    with conn.cursor() as cur:
+        cur.execute(f"DELETE FROM {table} WHERE region = ANY(%s)", (sorted(df["region"].unique().tolist()),))
+        execute_values(cur, f"INSERT INTO {table} ({col_sql}) VALUES %s", values, page_size=5000)
+    conn.commit()
+
+
+def main():
+    import argparse
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--path", type=str, default="data/marts/climatology/climatology.parquet")
+    ap.add_argument("--table", type=str, default="marts.era5_climatology")
+    add_cli_args(ap)
+    args = ap.parse_args()
+    configure_from_args(args)
+
+    fp = Path(args.path)
+    if not fp.exists():
+        print("No climatology parquet found.")
+        return
+
+    conn = connect()
+    try:
+        with stage("read_parquet") as st:
+            df = pd.read_parquet(fp)
+            st.rows = len(df)
+            st.bytes_read = file_size(fp)
+        with stage("replace") as st:
+            replace_df(conn, df, table=args.table)
+            st.rows = len(df)
+        print("OK:", fp)
+    finally:
+        conn.close()
+
+    publish_artifact()
+
+
+if __name__ == "__main__":
+    main()
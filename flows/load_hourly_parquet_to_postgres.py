@@ -1,12 +1,24 @@
 from __future__ import annotations
 
 import os
+import sys
 from pathlib import Path
 
 import pandas as pd
 import psycopg2
 from psycopg2.extras import execute_values
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.instrumentation import (  # noqa: E402
+    add_cli_args,
+    configure_from_args,
+    file_size,
+    partition,
+    publish_artifact,
+    stage,
+)
+from common.rollups import refresh_rollups  # noqa: E402
+
 
 def connect():
     host = os.getenv("PGHOST", "127.0.0.1")
@@ -41,6 +53,26 @@ def upsert_df(conn, df: pd.DataFrame, table: str = "marts.era5_hourly"):
     conn.commit()
 
 
+def load_file(conn, fp: Path, table: str = "marts.era5_hourly", rollups: bool = True) -> int:
+    # fp: .../region=<r>/year=<y>/month=<mm>.parquet
+    region = fp.parent.parent.name.removeprefix("region=")
+    year = int(fp.parent.name.removeprefix("year="))
+    month = int(fp.stem.removeprefix("month="))
+    with partition(region=region, year=year, month=month):
+        with stage("read_parquet") as st:
+            df = pd.read_parquet(fp)
+            st.rows = len(df)
+            st.bytes_read = file_size(fp)
+        with stage("upsert") as st:
+            upsert_df(conn, df, table=table)
+            st.rows = len(df)
+        if rollups:
+            # только корзины, в которые попали эти строки
+            with stage("rollups") as st:
+                st.rows = refresh_rollups(conn, table, df)
+    return len(df)
+
+
 def main():
     import argparse
 
@@ -49,7 +81,10 @@ def main():
     ap.add_argument("--months", type=str, default="1")
     ap.add_argument("--hourly-root", type=str, default="data/marts/hourly")
     ap.add_argument("--table", type=str, default="marts.era5_hourly")
+    ap.add_argument("--no-rollups", action="store_true", help="не обновлять rollup-таблицы")
+    add_cli_args(ap)
     args = ap.parse_args()
+    configure_from_args(args)
 
     months = [int(x) for x in args.months.split(",") if x.strip()]
     hourly_root = Path(args.hourly_root)
@@ -65,12 +100,13 @@ def main():
     conn = connect()
     try:
         for fp in sorted(files):
-            df = pd.read_parquet(fp)
-            upsert_df(conn, df, table=args.table)
+            load_file(conn, fp, table=args.table, rollups=not args.no_rollups)
             print("OK:", fp)
     finally:
         conn.close()
 
+    publish_artifact()
+
 
 if __name__ == "__main__":
     main()